@@ -1,20 +1,59 @@
-from typing import Any, Dict, List, Optional
+import asyncio
+import hashlib
+import json
+import re
+from typing import Any, Dict, FrozenSet, List, Optional, Union
 
-import requests
-from fastapi import APIRouter, HTTPException, Query
+import httpx
+from cachetools import TTLCache
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 
-import lyricsgenius
-
 from app.config import settings
-from app.utils.lyrics import flatten_dom, normalize, build_timed_annotations
+from app.services.http_client import get_http_client, get_with_retry
+from app.services.lrclib_batcher import LrclibBatcher, get_lrclib_batcher
+from app.services.rate_limiter import rate_limit
+from app.utils.lyrics import (
+    build_timed_annotations,
+    extract_lyrics_from_html,
+    flatten_dom,
+    normalize,
+)
 
 import logging
 
 
-router = APIRouter(prefix="/api/lyrics", tags=["lyrics"])
+router = APIRouter(prefix="/api/lyrics", tags=["lyrics"], default_response_class=ORJSONResponse)
 logger = logging.getLogger(__name__)
 
+# Genius serves a 403 to the default httpx User-Agent on song pages
+_SCRAPE_USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"
+)
+
+# Upstream song data is effectively immutable, so successful responses are kept
+# in memory for a while. Failures are never cached.
+_CACHE_SIZE = 4096
+_song_cache: TTLCache = TTLCache(maxsize=_CACHE_SIZE, ttl=settings.lyrics_cache_ttl)
+_artist_image_cache: TTLCache = TTLCache(maxsize=_CACHE_SIZE, ttl=settings.lyrics_cache_ttl)
+_annotations_cache: TTLCache = TTLCache(maxsize=_CACHE_SIZE, ttl=settings.lyrics_cache_ttl)
+_lrc_cache: TTLCache = TTLCache(maxsize=_CACHE_SIZE, ttl=settings.lyrics_cache_ttl)
+_lyrics_cache: TTLCache = TTLCache(maxsize=_CACHE_SIZE, ttl=settings.lyrics_cache_ttl)
+_MISSING = object()
+
+# Top-level keys of the /song response that clients can select with ?fields=
+SONG_RESPONSE_FIELDS = ("song", "lyrics", "lrc", "timed_lyrics")
+
+# Last ETag served per (song_id, fields), so a matching If-None-Match can be
+# answered with 304 before any upstream work
+_etag_cache: TTLCache = TTLCache(maxsize=_CACHE_SIZE, ttl=settings.lyrics_cache_ttl)
+
+# Runs of whitespace in bios, including the literal "\\n" / "\\u00a0" escapes
+# Genius leaves in description text
+_WS_RE = re.compile(r"(?:\\n|\\u00a0|\s)+")
+
 
 class SearchResult(BaseModel):
     id: int
@@ -31,18 +70,58 @@ def _get_genius_headers() -> Dict[str, str]:
     return {"Authorization": f"Bearer {settings.genius_token}"}
 
 
-@router.get("/search", response_model=List[SearchResult])
-def search_songs(q: str = Query(..., min_length=1, max_length=200)):
+def _parse_fields(fields: Optional[str]) -> FrozenSet[str]:
+    if not fields:
+        return frozenset(SONG_RESPONSE_FIELDS)
+    requested = frozenset(f.strip() for f in fields.split(",") if f.strip())
+    unknown = requested.difference(SONG_RESPONSE_FIELDS)
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid fields: {', '.join(sorted(unknown)) or fields}. "
+                   f"Allowed: {', '.join(SONG_RESPONSE_FIELDS)}"
+        )
+    return requested
+
+
+def _compute_etag(song_id: int, payload: Dict[str, Any]) -> str:
+    body = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return f'W/"{song_id}-{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    target = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == target for tag in if_none_match.split(","))
+
+
+async def _resolved(value: Any) -> Any:
+    return value
+
+
+@router.get(
+    "/search",
+    response_model=List[SearchResult],
+    dependencies=[Depends(rate_limit(10))],
+)
+async def search_songs(
+    q: str = Query(..., min_length=1, max_length=200),
+    client: httpx.AsyncClient = Depends(get_http_client),
+):
     headers = _get_genius_headers()
     try:
-        r = requests.get(
+        r = await get_with_retry(
+            client,
             "https://api.genius.com/search",
             headers=headers,
             params={"q": q},
-            timeout=15,
         )
         r.raise_for_status()
-    except requests.RequestException as exc:
+    except httpx.HTTPError as exc:
         raise HTTPException(status_code=502, detail=f"Genius search failed: {exc}")
 
     hits = r.json().get("response", {}).get("hits", [])[:5]
@@ -64,23 +143,160 @@ def search_songs(q: str = Query(..., min_length=1, max_length=200)):
     return results
 
 
-@router.get("/song/{song_id}")
-def resolve_song(song_id: int) -> Dict[str, Any]:
-    headers = _get_genius_headers()
+async def _fetch_lyrics(client: httpx.AsyncClient, song_url: Optional[str]) -> Optional[str]:
+    """Scrape lyrics from the Genius song page without blocking the event loop."""
+    if not song_url:
+        return None
+    cached = _lyrics_cache.get(song_url, _MISSING)
+    if cached is not _MISSING:
+        return cached
+
+    lyrics_text: Optional[str] = None
+    try:
+        logger.info(f"Fetching lyrics from Genius URL: {song_url}")
+        # Set User-Agent to avoid 403 Forbidden
+        resp = await get_with_retry(
+            client,
+            song_url,
+            headers={"User-Agent": _SCRAPE_USER_AGENT},
+            follow_redirects=True,
+        )
+        resp.raise_for_status()
+        # Parsing a full Genius page is CPU work, keep it off the event loop
+        loop = asyncio.get_running_loop()
+        lyrics_text = await loop.run_in_executor(None, extract_lyrics_from_html, resp.content)
+        logger.info(f"Fetched lyrics length: {len(lyrics_text) if lyrics_text else 'None'}")
+        if lyrics_text:
+            logger.info(f"First 100 chars: {lyrics_text[:100]}")
+        _lyrics_cache[song_url] = lyrics_text
+    except Exception as e:
+        logger.error(f"Failed to fetch lyrics from Genius: {e}")
+        lyrics_text = None
+    return lyrics_text
+
+
+async def _fetch_artist_image(
+    client: httpx.AsyncClient, headers: Dict[str, str], artist_id: Optional[int]
+) -> Optional[str]:
+    if not artist_id:
+        return None
+    cached = _artist_image_cache.get(artist_id, _MISSING)
+    if cached is not _MISSING:
+        return cached
+    try:
+        artist_resp = await get_with_retry(
+            client,
+            f"https://api.genius.com/artists/{artist_id}",
+            headers=headers,
+        )
+        artist_resp.raise_for_status()
+        artist = artist_resp.json().get("response", {}).get("artist", {}) or {}
+    except httpx.HTTPError:
+        return None
+    image_url = artist.get("image_url")
+    _artist_image_cache[artist_id] = image_url
+    return image_url
+
+
+async def _fetch_fragment_annotations(
+    client: httpx.AsyncClient, headers: Dict[str, str], song_id: int
+) -> List[Dict[str, str]]:
+    cached = _annotations_cache.get(song_id)
+    if cached is not None:
+        return cached
+
+    try:
+        ref_resp = await get_with_retry(
+            client,
+            "https://api.genius.com/referents",
+            headers=headers,
+            params={"song_id": song_id, "per_page": 50},
+        )
+        ref_resp.raise_for_status()
+        referents = ref_resp.json().get("response", {}).get("referents", [])
+    except httpx.HTTPError:
+        return []
+
+    # Collect candidates first, then flatten/normalize in one pass with local
+    # aliases for the hot helpers
+    _flatten = flatten_dom
+    _norm = normalize
+    candidates = [
+        (ref.get("fragment"), (ann.get("body") or {}).get("dom"))
+        for ref in referents
+        for ann in ref.get("annotations", [])
+        if ann.get("votes_total", 0) >= 3
+    ]
+    fragment_annotations = [
+        {"fragment": _norm(fragment or ""), "annotation": annotation_text}
+        for fragment, dom in candidates
+        if dom and (annotation_text := _flatten(dom).strip())
+    ]
+    _annotations_cache[song_id] = fragment_annotations
+    return fragment_annotations
+
+
+async def _fetch_lrc(lrclib: LrclibBatcher, query: Optional[str]) -> Optional[str]:
+    # LRC via lrclib
+    cached = _lrc_cache.get(query, _MISSING)
+    if cached is not _MISSING:
+        return cached
+    try:
+        lrc_text = await lrclib.search(query)
+    except (httpx.HTTPError, ValueError):
+        return None
+    _lrc_cache[query] = lrc_text
+    return lrc_text
+
 
+async def _fetch_song(
+    client: httpx.AsyncClient, headers: Dict[str, str], song_id: int
+) -> Dict[str, Any]:
+    cached = _song_cache.get(song_id)
+    if cached is not None:
+        return cached
     try:
-        r = requests.get(
+        r = await get_with_retry(
+            client,
             f"https://api.genius.com/songs/{song_id}",
             headers=headers,
-            timeout=15,
         )
         r.raise_for_status()
-    except requests.RequestException as exc:
+    except httpx.HTTPError as exc:
         raise HTTPException(status_code=502, detail=f"Genius song fetch failed: {exc}")
 
     song = r.json().get("response", {}).get("song")
     if not song:
         raise HTTPException(status_code=404, detail="Song not found")
+    _song_cache[song_id] = song
+    return song
+
+
+@router.get(
+    "/song/{song_id}",
+    response_model=None,
+    dependencies=[Depends(rate_limit(30))],
+)
+async def resolve_song(
+    song_id: int,
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(
+        None,
+        description="Comma-separated subset of song,lyrics,lrc,timed_lyrics (default: all)",
+    ),
+    client: httpx.AsyncClient = Depends(get_http_client),
+    lrclib: LrclibBatcher = Depends(get_lrclib_batcher),
+) -> Union[Dict[str, Any], Response]:
+    requested = _parse_fields(fields)
+    if_none_match = request.headers.get("if-none-match")
+    cached_etag = _etag_cache.get((song_id, requested))
+    if cached_etag and _etag_matches(if_none_match, cached_etag):
+        return Response(status_code=304, headers={"ETag": cached_etag})
+
+    headers = _get_genius_headers()
+
+    song = await _fetch_song(client, headers, song_id)
 
     mapped_song: Dict[str, Any] = {
         "annotation_count": song.get("annotation_count"),
@@ -96,101 +312,38 @@ def resolve_song(song_id: int) -> Dict[str, Any]:
     }
 
     description_dom = (song.get("description") or {}).get("dom")
-    if description_dom:
-        bio_text = flatten_dom(description_dom)
-        bio_text = bio_text.replace("\\n", " ").replace("\\u00a0", " ")
-        bio_text = " ".join(bio_text.split())
-    else:
-        bio_text = ""
+    bio_text = _WS_RE.sub(" ", flatten_dom(description_dom)).strip() if description_dom else ""
     mapped_song["bio"] = bio_text
 
-    # Lyrics via lyricsgenius (scrapes Genius page)
-    genius = lyricsgenius.Genius(settings.genius_token)
-    genius.remove_section_headers = False
-    
-    # Set User-Agent to avoid 403 Forbidden
-    genius._session.headers['User-Agent'] = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36'
+    query_terms = " ".join([mapped_song.get("title") or "", mapped_song["artists"][0] if mapped_song["artists"] else ""]).strip()
 
-    lyrics_text: Optional[str] = None
-    try:
-        song_url = song.get("url")
-        logger.info(f"Fetching lyrics from Genius URL: {song_url}")
-        if song_url:
-            # Must use keyword argument for song_url to avoid it being interpreted as song_id
-            lyrics_text = genius.lyrics(song_url=song_url)
-            logger.info(f"Fetched lyrics length: {len(lyrics_text) if lyrics_text else 'None'}")
-            if lyrics_text:
-                logger.info(f"First 100 chars: {lyrics_text[:100]}")
-    except Exception as e:
-        logger.error(f"Failed to fetch lyrics from Genius: {e}")
-        lyrics_text = None
+    # Only hit the upstreams the requested fields depend on
+    want_timed = "timed_lyrics" in requested
+    want_lyrics = want_timed or "lyrics" in requested
+    want_lrc = want_timed or "lrc" in requested
 
-    mapped_song["lyrics"] = lyrics_text
+    # Everything below only depends on the song payload, so fetch it concurrently
+    artist_image_url, fragment_annotations, lrc_text, lyrics_text = await asyncio.gather(
+        _fetch_artist_image(client, headers, mapped_song.get("artist_id"))
+        if "song" in requested else _resolved(None),
+        _fetch_fragment_annotations(client, headers, mapped_song["id"])
+        if want_timed else _resolved([]),
+        _fetch_lrc(lrclib, query_terms or mapped_song.get("title"))
+        if want_lrc else _resolved(None),
+        _fetch_lyrics(client, song.get("url"))
+        if want_lyrics else _resolved(None),
+    )
 
-    # Artist image
-    artist_image_url: Optional[str] = None
-    artist_id = mapped_song.get("artist_id")
-    if artist_id:
-        try:
-            artist_resp = requests.get(
-                f"https://api.genius.com/artists/{artist_id}",
-                headers=headers,
-                timeout=15,
-            )
-            artist_resp.raise_for_status()
-            artist = artist_resp.json().get("response", {}).get("artist", {}) or {}
-            artist_image_url = artist.get("image_url")
-        except requests.RequestException:
-            artist_image_url = None
+    mapped_song["lyrics"] = lyrics_text
     mapped_song["artist_image_url"] = artist_image_url
 
-    # Annotations
-    fragment_annotations: List[Dict[str, str]] = []
-    try:
-        ref_resp = requests.get(
-            "https://api.genius.com/referents",
-            headers=headers,
-            params={"song_id": mapped_song["id"], "per_page": 50},
-            timeout=15,
+    timed_annotated_lyrics = []
+    if want_timed:
+        # CPU-bound matching: keep it off the event loop so other requests aren't stalled
+        loop = asyncio.get_running_loop()
+        timed_annotated_lyrics = await loop.run_in_executor(
+            None, build_timed_annotations, lrc_text, lyrics_text, fragment_annotations
         )
-        ref_resp.raise_for_status()
-        referents = ref_resp.json().get("response", {}).get("referents", [])
-        for ref in referents:
-            fragment = ref.get("fragment")
-            for ann in ref.get("annotations", []):
-                if ann.get("votes_total", 0) < 3:
-                    continue
-                dom = (ann.get("body") or {}).get("dom")
-                if not dom:
-                    continue
-                annotation_text = flatten_dom(dom).strip()
-                if annotation_text:
-                    fragment_annotations.append(
-                        {
-                            "fragment": normalize(fragment or ""),
-                            "annotation": annotation_text,
-                        }
-                    )
-    except requests.RequestException:
-        fragment_annotations = []
-
-    # LRC via lrclib
-    lrc_text: Optional[str] = None
-    try:
-        query_terms = " ".join([mapped_song.get("title") or "", mapped_song["artists"][0] if mapped_song["artists"] else ""]).strip()
-        lrc_resp = requests.get(
-            "https://lrclib.net/api/search",
-            params={"q": query_terms or mapped_song.get("title")},
-            timeout=15,
-        )
-        lrc_resp.raise_for_status()
-        lrc_data = lrc_resp.json()
-        if lrc_data:
-            lrc_text = lrc_data[0].get("syncedLyrics")
-    except requests.RequestException:
-        lrc_text = None
-
-    timed_annotated_lyrics = build_timed_annotations(lrc_text, lyrics_text, fragment_annotations)
 
     try:
         lrc_len = len(lrc_text.splitlines()) if lrc_text else 0
@@ -205,9 +358,17 @@ def resolve_song(song_id: int) -> Dict[str, Any]:
         len(timed_annotated_lyrics),
     )
 
-    return {
+    payload = {
         "song": mapped_song,
         "lyrics": lyrics_text,
         "lrc": lrc_text,
-        "timed_lyrics": timed_annotated_lyrics,
+        "timed_lyrics": [timed_line.to_dict() for timed_line in timed_annotated_lyrics],
     }
+    payload = {key: value for key, value in payload.items() if key in requested}
+
+    etag = _compute_etag(song_id, payload)
+    _etag_cache[(song_id, requested)] = etag
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return payload
@@ -1,28 +1,34 @@
 """Audio separation API endpoints"""
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Form
-from fastapi.responses import FileResponse
-from pathlib import Path
+from fastapi import APIRouter, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import ORJSONResponse
 from datetime import datetime
 from typing import Optional
 import asyncio
+import hashlib
+import io
+import os
 import uuid
 import logging
-import shutil
-import time
+import re
+
+import aiofiles
+import soundfile as sf
 
 from app.config import settings
 # Note: app.models.schemas exists and contains Pydantic response models
 from app.models.schemas import JobResponse, SeparationResult, SystemCapabilities
-from app.services.job_store import get_job_store, Job, JobStatus
-from app.services.demucs_service import DemucsService, get_executor
-from app.services.system_detector import get_system_capabilities, SystemDetector
+from app.responses import range_file_response
+from app.services.job_store import Job, JobStatus
+from app.services.janitor import remove_later
+from app.services.separation_worker import submit_job
+from app.services.system_detector import SystemDetector
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/api/separate", tags=["separation"])
+router = APIRouter(prefix="/api/separate", tags=["separation"], default_response_class=ORJSONResponse)
 
 # Allowed audio file types
-ALLOWED_AUDIO_TYPES = {
+ALLOWED_AUDIO_TYPES = frozenset({
     "audio/mpeg",
     "audio/mp3",
     "audio/wav",
@@ -35,16 +41,78 @@ ALLOWED_AUDIO_TYPES = {
     "audio/m4a",
     "audio/x-m4a",
     "video/mp4"
+})
+
+# Leading bytes of each upload kept in memory for header validation
+HEADER_PREFIX_SIZE = 64 * 1024
+
+# Extensions whose headers soundfile can parse directly
+SOUNDFILE_EXTENSIONS = frozenset({".wav", ".flac", ".ogg"})
+
+# Container signatures (as detected by sniff_audio_type) accepted per extension
+# for formats soundfile can't parse
+_COMPRESSED_FORMAT_TYPES = {
+    ".mp3": frozenset({"audio/mpeg"}),
+    ".aac": frozenset({"audio/aac"}),
+    ".m4a": frozenset({"audio/mp4"}),
+    ".mp4": frozenset({"audio/mp4"}),
 }
 
+_TERMINAL_STATUSES = frozenset({JobStatus.COMPLETED, JobStatus.FAILED})
+
+# Characters allowed in stored upload filenames; everything else becomes "_"
+_UNSAFE_FILENAME_CHARS = re.compile(r"[^A-Za-z0-9._ -]")
+
+
+def sniff_audio_type(header: bytes) -> Optional[str]:
+    """
+    Identify an audio container from its leading bytes.
+
+    Args:
+        header: First bytes of the file (at least 12)
+
+    Returns:
+        MIME type of the detected format, or None if it isn't a known audio format
+    """
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "audio/wav"
+    if header[:4] == b"fLaC":
+        return "audio/flac"
+    if header[:4] == b"OggS":
+        return "audio/ogg"
+    if header[4:8] == b"ftyp":
+        return "audio/mp4"
+    if header[:3] == b"ID3":
+        return "audio/mpeg"
+    if len(header) >= 2 and header[0] == 0xFF:
+        # ADTS AAC: 12-bit sync word, layer bits 00
+        if header[1] & 0xF6 == 0xF0:
+            return "audio/aac"
+        # MPEG audio frame: 11-bit sync word, layer bits non-zero
+        if header[1] & 0xE0 == 0xE0 and header[1] & 0x06:
+            return "audio/mpeg"
+    return None
+
+
+def secure_filename(filename: Optional[str]) -> str:
+    """
+    Reduce a client-supplied filename to a safe basename.
+
+    Drops any directory components (either separator), replaces unusual
+    characters and leading dots, and falls back to "upload".
+    """
+    name = re.split(r"[\\/]", filename or "")[-1]
+    name = _UNSAFE_FILENAME_CHARS.sub("_", name).strip().lstrip(".")
+    return name or "upload"
+
 
 @router.get("/history", response_model=list[JobResponse])
-async def get_history():
+async def get_history(request: Request):
     """
     Get a list of previously completed separation jobs.
     Scans the job store (which is populated from disk on startup).
     """
-    job_store = get_job_store()
+    job_store = request.app.state.job_store
     
     # Get all completed jobs
     completed_jobs = job_store.list_jobs(status=JobStatus.COMPLETED)
@@ -71,16 +139,21 @@ async def get_history():
 
 @router.post("/upload", response_model=JobResponse)
 async def upload_audio(
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(...),
-    quality: int = Form(1),
-    model: Optional[str] = Form(None)
+    request: Request,
+    filename: str = Query(..., min_length=1, max_length=255),
+    quality: int = Query(1),
+    model: Optional[str] = Query(None)
 ):
     """
     Upload an audio file for separation.
 
+    The request body is the raw file bytes (not multipart), with the file's
+    MIME type as the Content-Type. It is streamed straight to disk, so the
+    upload is never buffered in memory or spooled to a temp file first.
+
     Args:
-        file: Audio file to separate
+        request: Incoming request whose body is the audio file
+        filename: Original filename of the audio file
         quality: Quality parameter (1-5, higher = better quality but slower)
         model: Optional model override (htdemucs, htdemucs_ft, htdemucs_6s)
 
@@ -88,10 +161,11 @@ async def upload_audio(
         Job information with job_id and status
     """
     # Validate file type
-    if file.content_type not in ALLOWED_AUDIO_TYPES:
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in ALLOWED_AUDIO_TYPES:
         raise HTTPException(
             status_code=400,
-            detail=f"Invalid file type: {file.content_type}. Must be an audio file."
+            detail=f"Invalid file type: {content_type or 'missing'}. Must be an audio file."
         )
 
     # Validate quality parameter
@@ -101,17 +175,6 @@ async def upload_audio(
             detail="Quality must be between 1 and 5"
         )
 
-    # Check file size
-    file.file.seek(0, 2)  # Seek to end
-    file_size = file.file.tell()
-    file.file.seek(0)  # Reset to beginning
-
-    if file_size > settings.max_file_size:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File too large. Maximum size: {settings.max_file_size / (1024*1024):.0f}MB"
-        )
-
     # Generate job ID
     job_id = str(uuid.uuid4())
 
@@ -120,62 +183,98 @@ async def upload_audio(
     job_upload_dir.mkdir(parents=True, exist_ok=True)
 
     # Save uploaded file with sanitized filename (prevent path traversal)
-    # Use only the basename to prevent directory traversal attacks
-    safe_filename = Path(file.filename).name if file.filename else "upload"
+    safe_filename = secure_filename(filename)
     input_path = job_upload_dir / safe_filename
+
+    # Stream to disk in chunks, enforcing the size limit as bytes arrive so
+    # oversized uploads are rejected without writing the whole payload
+    file_size = 0
+    too_large = False
+    sniffed_type = None
+    header = b""
+    prefix = bytearray()
+    # Content hash of the upload, for skipping re-separation of identical files
+    hasher = hashlib.blake2b()
     try:
-        with open(input_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        logger.info(f"File uploaded for job {job_id}: {input_path}")
+        async with aiofiles.open(input_path, "wb") as buffer:
+            async for chunk in request.stream():
+                if sniffed_type is None:
+                    # Check the magic bytes rather than trusting the client's MIME type
+                    header += chunk
+                    if len(header) < 12:
+                        continue
+                    sniffed_type = sniff_audio_type(header[:12])
+                    if sniffed_type is None:
+                        break
+                    chunk, header = header, b""
+                if len(prefix) < HEADER_PREFIX_SIZE:
+                    prefix += chunk[:HEADER_PREFIX_SIZE - len(prefix)]
+                file_size += len(chunk)
+                if file_size > settings.max_file_size:
+                    too_large = True
+                    break
+                hasher.update(chunk)
+                await buffer.write(chunk)
+        if sniffed_type is not None and not too_large:
+            logger.info(f"File uploaded for job {job_id}: {input_path} ({sniffed_type})")
     except Exception as e:
         logger.error(f"Error saving uploaded file: {e}")
+        remove_later(job_upload_dir)
         raise HTTPException(status_code=500, detail="Error saving uploaded file")
-    finally:
-        try:
-            await file.close()
-        except Exception as e:
-            logger.warning(f"Failed to close uploaded file for job {job_id}: {e}")
 
-    # Validate actual file content (not just MIME type which can be spoofed)
-    # Note: We use a simple size/extension check for MP3 since soundfile/libsndfile
+    if sniffed_type is None:
+        remove_later(job_upload_dir)
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid audio file. File contents do not match a supported audio format."
+        )
+
+    if too_large:
+        remove_later(job_upload_dir)
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum size: {settings.max_file_size / (1024*1024):.0f}MB"
+        )
+
+    # Validate actual file content (not just MIME type which can be spoofed),
+    # using the prefix captured while streaming rather than re-reading the file.
+    # Note: We use a simple size/signature check for MP3 since soundfile/libsndfile
     # often lacks MP3 support. Demucs uses ffmpeg internally which handles all formats.
     try:
-        import soundfile as sf
         file_ext = input_path.suffix.lower()
 
-        # For formats soundfile supports (WAV, FLAC, OGG), validate with soundfile
-        if file_ext in ['.wav', '.flac', '.ogg']:
-            info = sf.info(str(input_path))
-            logger.info(f"Validated audio file: {info.samplerate}Hz, {info.channels} channels, {info.duration:.1f}s")
-        # For MP3 and other formats, do basic file size check
+        # For formats soundfile supports (WAV, FLAC, OGG), parse the header with soundfile
+        if file_ext in SOUNDFILE_EXTENSIONS:
+            try:
+                info = sf.info(io.BytesIO(prefix))
+            except Exception:
+                # Metadata (e.g. embedded cover art) can push the header past the
+                # prefix; parse the complete file instead
+                info = await asyncio.to_thread(sf.info, str(input_path))
+            logger.info(f"Validated audio header: {info.samplerate}Hz, {info.channels} channels")
+        # For MP3 and other formats, check size and that the signature matches the extension
         # (Demucs will validate properly using ffmpeg during processing)
-        elif file_ext in ['.mp3', '.m4a', '.aac', '.mp4']:
-            file_size = input_path.stat().st_size
+        elif file_ext in _COMPRESSED_FORMAT_TYPES:
             if file_size < 100:  # Suspiciously small
                 raise ValueError(f"File too small ({file_size} bytes) to be valid audio")
+            if sniffed_type not in _COMPRESSED_FORMAT_TYPES[file_ext]:
+                raise ValueError(f"File contents ({sniffed_type}) do not match extension {file_ext}")
             logger.info(f"Accepted {file_ext} file ({file_size} bytes) - will be validated by Demucs")
         else:
             raise ValueError(f"Unsupported audio format: {file_ext}")
     except Exception as e:
         # Invalid audio file - clean up and reject
         logger.warning(f"Invalid audio file for job {job_id}: {e}")
-        input_path.unlink(missing_ok=True)
-        try:
-            shutil.rmtree(job_upload_dir, ignore_errors=True)
-        except Exception as cleanup_error:
-            logger.warning(
-                f"Failed to clean up upload dir for invalid job {job_id}: {cleanup_error}"
-            )
+        remove_later(job_upload_dir)
         raise HTTPException(
             status_code=400,
             detail=f"Invalid audio file. Could not read audio data: {str(e)}"
         )
 
-    # Get system capabilities
-    capabilities = get_system_capabilities(force_cpu=settings.force_cpu)
+    # System capabilities (detected once at startup)
+    capabilities = request.app.state.capabilities
 
-    # Get job store for capacity checks and enqueue
-    job_store = get_job_store()
+    job_store = request.app.state.job_store
 
     # Determine which model to use
     if model is None:
@@ -186,6 +285,7 @@ async def upload_audio(
         # Validate requested model
         is_valid, error_msg = SystemDetector.validate_model_for_system(model, capabilities)
         if not is_valid:
+            remove_later(job_upload_dir)
             raise HTTPException(status_code=400, detail=error_msg)
         selected_model = model
         segment = capabilities.recommended_segment
@@ -198,33 +298,45 @@ async def upload_audio(
         model_used=selected_model,
         created_at=datetime.now(),
         input_path=str(input_path),
-        output_dir=str(settings.output_dir / job_id)
+        output_dir=str(settings.output_dir / job_id),
+        content_key=f"{hasher.hexdigest()}:{selected_model}:{quality}"
     )
 
-    # Add to job store with an atomic capacity check
-    added, active_jobs = job_store.try_add_with_capacity(job, capabilities.max_concurrent_jobs)
-    if not added:
-        # Clean up saved upload when at capacity
-        try:
-            shutil.rmtree(job_upload_dir, ignore_errors=True)
-        except Exception as e:
-            logger.warning(f"Failed to clean up upload dir for rejected job {job_id}: {e}")
+    # The same file with the same settings was already separated (or is in
+    # progress): hand back that job instead of running Demucs again
+    existing = job_store.add_if_new(job)
+    if existing is not None:
+        remove_later(job_upload_dir)
+        logger.info(f"Upload for job {job_id} matches job {existing.job_id}; reusing it")
+        return JobResponse(
+            job_id=existing.job_id,
+            filename=existing.filename,
+            status=existing.status,
+            progress=existing.progress,
+            error=existing.error_message
+        )
+
+    # Hand off to the separation workers. The bounded queue is the
+    # backpressure: when it's full the job is rejected.
+    try:
+        submit_job(
+            job_id,
+            selected_model,
+            capabilities.device,
+            segment,
+            quality,
+            capabilities.precision,
+            capabilities.recommended_batch_size
+        )
+    except asyncio.QueueFull:
+        job_store.delete(job_id)
+        remove_later(job_upload_dir)
 
         raise HTTPException(
             status_code=429,
-            detail=f"System at capacity. Currently queued/processing {active_jobs} job(s). Please try again later."
+            detail="System at capacity. Too many jobs are queued. Please try again later."
         )
 
-    # Queue background processing
-    background_tasks.add_task(
-        process_separation_job,
-        job_id,
-        selected_model,
-        capabilities.device,
-        segment,
-        quality
-    )
-
     logger.info(f"Job {job_id} queued for processing with model {selected_model}")
 
     return JobResponse(
@@ -236,135 +348,70 @@ async def upload_audio(
     )
 
 
-async def process_separation_job(
-    job_id: str,
-    model: str,
-    device: str,
-    segment: Optional[int],
-    shifts: int
-):
+def _job_status_payload(job: Job) -> dict:
     """
-    Background task to process audio separation.
+    Build a JobResponse-shaped dict for a job.
 
-    Args:
-        job_id: Job ID
-        model: Demucs model name
-        device: "cuda" or "cpu"
-        segment: Segment size for memory constraints
-        shifts: Quality parameter (1-5)
+    Status is polled (or pushed) many times per job, so these paths skip
+    constructing and re-validating a pydantic model and hand the dict
+    straight to orjson.
     """
-    job_store = get_job_store()
-    start_time = time.time()
+    return {
+        "job_id": job.job_id,
+        "filename": job.filename,
+        "status": job.status.value,
+        "progress": job.progress,
+        "error": job.error_message,
+    }
 
-    try:
-        # Update job status to processing
-        # Note: Job is marked as PROCESSING when background task starts, even though
-        # actual separation work may be queued in the thread pool. This is acceptable
-        # since the background task is running (not waiting in FastAPI queue) and the
-        # distinction between "queued in executor" vs "actively processing" is minimal
-        # for end users. For production, consider a job queue with explicit queued state.
-        job_store.update(
-            job_id,
-            status=JobStatus.PROCESSING,
-            started_at=datetime.now(),
-            progress=0.1
-        )
-
-        job = job_store.get(job_id)
-        if job is None:
-            logger.error(f"Job {job_id} not found")
-            return
-
-        # Initialize Demucs service off the event loop (model load can be expensive)
-        logger.info(f"Initializing Demucs for job {job_id}")
-        loop = asyncio.get_running_loop()
-        demucs_service = await loop.run_in_executor(
-            get_executor(),
-            lambda: DemucsService(
-                model=model,
-                device=device,
-                segment=segment,
-                shifts=shifts,
-                overlap=settings.demucs_overlap
-            )
-        )
-
-        # Update progress
-        job_store.update(job_id, progress=0.2)
 
-        # Run separation
-        logger.info(f"Starting separation for job {job_id}")
-        stems = await demucs_service.separate_audio(
-            input_path=Path(job.input_path),
-            output_dir=settings.output_dir,
-            job_id=job_id
-        )
-
-        # Convert Path objects to strings and filter out None values
-        stems_dict = {
-            name: str(path) if path is not None else None
-            for name, path in stems.items()
-        }
-
-        # Calculate processing time
-        processing_time = time.time() - start_time
+@router.get("/status/{job_id}", response_model=None, responses={200: {"model": JobResponse}})
+async def get_status(job_id: str, request: Request):
+    """Get the status of a separation job."""
+    job_store = request.app.state.job_store
+    job = job_store.get(job_id)
 
-        # Update job with results
-        job_store.update(
-            job_id,
-            status=JobStatus.COMPLETED,
-            completed_at=datetime.now(),
-            stems=stems_dict,
-            progress=1.0,
-            processing_time=processing_time
-        )
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
 
-        # Save metadata
-        job_store.save_metadata(job_id)
-        try:
-            shutil.rmtree(settings.upload_dir / job_id, ignore_errors=True)
-        except Exception as cleanup_error:
-            logger.warning(f"Failed to clean up upload dir for job {job_id}: {cleanup_error}")
+    return ORJSONResponse(_job_status_payload(job))
 
-        logger.info(f"Job {job_id} completed successfully in {processing_time:.2f}s")
 
-    except Exception as e:
-        logger.error(f"Error processing job {job_id}: {e}", exc_info=True)
-        job_store.update(
-            job_id,
-            status=JobStatus.FAILED,
-            error_message=str(e),
-            completed_at=datetime.now()
-        )
-        job_store.save_metadata(job_id)
-        try:
-            shutil.rmtree(settings.upload_dir / job_id, ignore_errors=True)
-        except Exception as cleanup_error:
-            logger.warning(f"Failed to clean up upload dir for failed job {job_id}: {cleanup_error}")
+@router.websocket("/ws/{job_id}")
+async def watch_status(websocket: WebSocket, job_id: str):
+    """
+    Push status updates for a job until it completes or fails.
 
+    Sends the current status on connect, then one message (same shape as
+    GET /status/{job_id}) per update. Preferred over polling /status.
+    """
+    job_store = websocket.app.state.job_store
+    await websocket.accept()
 
-@router.get("/status/{job_id}", response_model=JobResponse)
-async def get_status(job_id: str):
-    """Get the status of a separation job."""
-    job_store = get_job_store()
-    job = job_store.get(job_id)
+    # The subscription's first snapshot is the current state, so no update is missed
+    updates = job_store.subscribe(job_id)
+    try:
+        if updates.empty():
+            await websocket.close(code=4404, reason="Job not found")
+            return
 
-    if job is None:
-        raise HTTPException(status_code=404, detail="Job not found")
+        while True:
+            job = await updates.get()
+            await websocket.send_json(_job_status_payload(job))
+            if job.status in _TERMINAL_STATUSES:
+                break
 
-    return JobResponse(
-        job_id=job.job_id,
-        filename=job.filename,
-        status=job.status,
-        progress=job.progress,
-        error=job.error_message
-    )
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info(f"Status websocket for job {job_id} disconnected")
+    finally:
+        job_store.unsubscribe(job_id, updates)
 
 
-@router.get("/result/{job_id}", response_model=SeparationResult)
-async def get_result(job_id: str):
+@router.get("/result/{job_id}", response_model=None, responses={200: {"model": SeparationResult}})
+async def get_result(job_id: str, request: Request):
     """Get the separated audio tracks for a completed job."""
-    job_store = get_job_store()
+    job_store = request.app.state.job_store
     job = job_store.get(job_id)
 
     if job is None:
@@ -387,18 +434,41 @@ async def get_result(job_id: str):
         else:
             tracks[stem_name] = None
 
-    return SeparationResult(
-        job_id=job_id,
-        status=job.status,
-        tracks=tracks,
-        duration=job.processing_time
-    )
+    return ORJSONResponse({
+        "job_id": job_id,
+        "status": job.status.value,
+        "tracks": tracks,
+        "duration": job.processing_time,
+    })
+
+
+def _transcode_to_wav(source_path: str, wav_path: str) -> None:
+    """Decode a stem and write it as 16-bit WAV (runs in thread pool)."""
+    data, samplerate = sf.read(source_path, dtype="int16")
+    tmp_path = f"{wav_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        sf.write(tmp_path, data, samplerate, format="WAV", subtype="PCM_16")
+        os.replace(tmp_path, wav_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
 
 
 @router.get("/download/{job_id}/{stem_name}")
-async def download_stem(job_id: str, stem_name: str):
-    """Download a specific stem from a completed job."""
-    job_store = get_job_store()
+async def download_stem(
+    job_id: str,
+    stem_name: str,
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(flac|wav)$")
+):
+    """
+    Download a specific stem from a completed job (supports Range requests for seeking).
+
+    Stems are stored as FLAC. Clients that need WAV can ask with ?format=wav
+    or an Accept header naming audio/wav; the WAV is transcoded once and kept
+    alongside the FLAC.
+    """
+    job_store = request.app.state.job_store
     job = job_store.get(job_id)
 
     if job is None:
@@ -420,21 +490,49 @@ async def download_stem(job_id: str, stem_name: str):
             detail=f"Stem '{stem_name}' not available for this model"
         )
 
-    file_path = Path(stem_path)
-    if not file_path.exists():
+    # Plain strings and os.path here: this endpoint is hit for every stem of every result
+    if not os.path.exists(stem_path):
         raise HTTPException(status_code=404, detail="Stem file not found on disk")
 
-    return FileResponse(
-        path=file_path,
-        media_type="audio/wav",
-        filename=f"{stem_name}.wav"
+    if format is None:
+        accept = request.headers.get("accept", "")
+        wants_wav = "audio/wav" in accept and "audio/flac" not in accept
+    else:
+        wants_wav = format == "wav"
+
+    base, extension = os.path.splitext(stem_path)
+    if wants_wav and extension != ".wav":
+        wav_path = base + ".wav"
+        if not os.path.exists(wav_path):
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, _transcode_to_wav, stem_path, wav_path)
+        stem_path, extension = wav_path, ".wav"
+
+    extension = extension.lstrip(".")
+    if settings.use_xaccel:
+        # Let the reverse proxy send the file (sendfile, Range and all)
+        relative_path = os.path.relpath(stem_path, settings.output_dir).replace(os.sep, "/")
+        return Response(
+            status_code=200,
+            headers={
+                "X-Accel-Redirect": f"{settings.xaccel_prefix}{relative_path}",
+                "Content-Disposition": f'attachment; filename="{stem_name}.{extension}"',
+                "Content-Type": f"audio/{extension}",
+            }
+        )
+
+    return range_file_response(
+        request,
+        stem_path,
+        media_type=f"audio/{extension}",
+        filename=f"{stem_name}.{extension}"
     )
 
 
 @router.get("/capabilities", response_model=SystemCapabilities)
-async def get_capabilities():
+async def get_capabilities(request: Request):
     """Get system capabilities and recommended settings."""
-    capabilities = get_system_capabilities(force_cpu=settings.force_cpu)
+    capabilities = request.app.state.capabilities
 
     return SystemCapabilities(
         has_gpu=capabilities.has_gpu,
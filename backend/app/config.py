@@ -1,6 +1,7 @@
 """Application configuration"""
 from pydantic_settings import BaseSettings
 from pathlib import Path
+import os
 
 
 class Settings(BaseSettings):
@@ -15,6 +16,9 @@ class Settings(BaseSettings):
 
     # Demucs Model Settings
     demucs_overlap: float = 0.25  # Overlap between segments (used by DemucsService)
+    demucs_mixed_precision: bool = True  # bf16/fp16 autocast on GPUs with tensor cores (CPU always runs fp32)
+    demucs_compile: bool = False  # torch.compile the model (slow first load, faster inference)
+    demucs_cuda_graphs: bool = False  # Replay the segment forward as a CUDA graph (ignored with demucs_compile)
 
     # System Detection
     force_cpu: bool = False  # Override GPU detection if needed
@@ -24,11 +28,17 @@ class Settings(BaseSettings):
     output_dir: Path = Path("./outputs")
     cache_dir: Path = Path("./cache")
 
+    # Stem downloads behind nginx: hand the file off via X-Accel-Redirect instead of
+    # streaming it through Python. The prefix must map to output_dir (see README).
+    use_xaccel: bool = False
+    xaccel_prefix: str = "/_protected_stems/"
+
     # Performance
-    max_workers: int = 2  # Thread pool workers for concurrent separation jobs
+    max_workers: int = 2  # Thread pool size for GPU separations
 
     # External API keys
     genius_token: str | None = None
+    lyrics_cache_ttl: int = 3600  # Seconds to cache Genius/lrclib responses in memory
 
     class Config:
         env_file = ".env"
@@ -38,6 +48,5 @@ class Settings(BaseSettings):
 settings = Settings()
 
 # Ensure directories exist
-settings.upload_dir.mkdir(exist_ok=True)
-settings.output_dir.mkdir(exist_ok=True)
-settings.cache_dir.mkdir(exist_ok=True)
+for directory in (settings.upload_dir, settings.output_dir, settings.cache_dir):
+    os.makedirs(directory, exist_ok=True)
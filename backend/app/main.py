@@ -1,28 +1,95 @@
 """Main FastAPI application"""
+import asyncio
+import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.separation import router as separation_router
 from app.api.lyrics import router as lyrics_router
+from app.config import settings
+from app.middleware import ContentLengthLimitMiddleware, SelectiveGZipMiddleware
+
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application lifecycle (startup/shutdown)."""
     # Startup: Initialize shared resources
-    from app.services.demucs_service import get_executor
+    from app.services.demucs_service import (
+        get_executor,
+        get_gpu_pools,
+        get_process_pool,
+        preload_model,
+        shutdown_process_pool
+    )
     from app.services.job_store import get_job_store
-    from app.config import settings
+    from app.services.http_client import create_http_client
+    from app.services.lrclib_batcher import LrclibBatcher
+    from app.services import janitor, separation_worker
+    from app.services.system_detector import get_system_capabilities
     
-    executor = get_executor()
+    app.state.executor = get_executor()
+    janitor.start(settings.upload_dir)
+    app.state.http = create_http_client()
+    app.state.lrclib = LrclibBatcher(app.state.http)
+    app.state.lrclib.start()
     
     # Load existing jobs from disk
-    job_store = get_job_store()
-    job_store.load_from_disk(settings.output_dir)
+    app.state.job_store = get_job_store()
+    app.state.job_store.open_database(settings.output_dir / "jobs.db")
+    app.state.job_store.load_from_disk(settings.output_dir)
+
+    # Hardware doesn't change while the server runs; detect once for all requests
+    capabilities = get_system_capabilities(force_cpu=settings.force_cpu)
+    app.state.capabilities = capabilities
+
+    # Load the default model up front so the first job doesn't pay for it. CPU and
+    # multi-GPU jobs run in worker processes, so there each process loads its own copy.
+    loop = asyncio.get_running_loop()
+    model_args = (
+        capabilities.recommended_model,
+        capabilities.device,
+        capabilities.recommended_segment,
+        settings.demucs_overlap,
+        capabilities.precision,
+        capabilities.recommended_batch_size
+    )
+    try:
+        if capabilities.device == "cpu":
+            pool = get_process_pool()
+            await asyncio.gather(*(
+                loop.run_in_executor(pool, preload_model, *model_args)
+                for _ in range(capabilities.max_concurrent_jobs)
+            ))
+        elif get_gpu_pools():
+            await asyncio.gather(*(
+                loop.run_in_executor(pool, preload_model, *model_args)
+                for pool in get_gpu_pools()
+            ))
+        else:
+            await loop.run_in_executor(app.state.executor, preload_model, *model_args)
+    except Exception as e:
+        logger.warning(f"Demucs model pre-warm failed (will load on first job): {e}")
+
+    # Spawn the separation workers; the queue holds as many pending jobs as can run at once.
+    # max_concurrent_jobs is per device, so multi-GPU hosts run that many on each GPU.
+    device_count = len(get_gpu_pools()) if capabilities.device == "cuda" else 0
+    concurrent_jobs = capabilities.max_concurrent_jobs * max(1, device_count)
+    separation_worker.start(
+        num_workers=concurrent_jobs,
+        max_pending=concurrent_jobs
+    )
     
     yield
     # Shutdown: Clean up resources
-    executor.shutdown(wait=True)
+    await separation_worker.shutdown()
+    await app.state.lrclib.stop()
+    await app.state.http.aclose()
+    shutdown_process_pool()
+    app.state.executor.shutdown(wait=True)
+    app.state.job_store.close()
+    janitor.stop()
 
 
 app = FastAPI(
@@ -32,7 +99,21 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# Configure CORS for local development
+# Turn away oversized uploads before their body is read
+app.add_middleware(
+    ContentLengthLimitMiddleware,
+    max_body_size=settings.max_file_size,
+    paths=frozenset({"/api/separate/upload"}),
+)
+
+# Compress JSON responses; stem audio is served as-is
+app.add_middleware(
+    SelectiveGZipMiddleware,
+    minimum_size=1024,
+    exclude_prefixes=("/api/separate/download",),
+)
+
+# Configure CORS for local development (added last so it also wraps early rejections)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -0,0 +1,62 @@
+"""ASGI middleware"""
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class ContentLengthLimitMiddleware:
+    """
+    Reject uploads whose declared Content-Length is over the limit.
+
+    Runs before FastAPI reads (and spools) the request body, so oversized
+    uploads are turned away without transferring them. Requests without a
+    Content-Length (chunked transfer) pass through; the upload handler
+    still enforces the limit while streaming to disk.
+    """
+
+    def __init__(self, app: ASGIApp, max_body_size: int, paths: frozenset[str]):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"] in self.paths:
+            for name, value in scope["headers"]:
+                if name != b"content-length":
+                    continue
+                try:
+                    content_length = int(value)
+                except ValueError:
+                    break
+                if content_length > self.max_body_size:
+                    limit_mb = self.max_body_size / (1024 * 1024)
+                    response = JSONResponse(
+                        {"detail": f"File too large. Maximum size: {limit_mb:.0f}MB"},
+                        status_code=413
+                    )
+                    await response(scope, receive, send)
+                    return
+                break
+
+        await self.app(scope, receive, send)
+
+
+class SelectiveGZipMiddleware:
+    """
+    GZip responses except under the excluded path prefixes.
+
+    Lyrics/LRC JSON compresses very well, but stem downloads are audio that
+    gzip can't shrink, so those bypass compression (and keep their
+    Content-Length for range requests and progress bars).
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, exclude_prefixes: tuple[str, ...] = ()):
+        self.app = app
+        self.gzip_app = GZipMiddleware(app, minimum_size=minimum_size)
+        self.exclude_prefixes = exclude_prefixes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and not scope["path"].startswith(self.exclude_prefixes):
+            await self.gzip_app(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -0,0 +1,119 @@
+"""Custom responses"""
+import os
+from typing import AsyncIterator, Optional, Tuple
+
+import aiofiles
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+# Read size when streaming a byte range from disk
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def _parse_range(range_header: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single `bytes=` range into inclusive (start, end) offsets.
+
+    Returns None when the header isn't a single, syntactically valid byte
+    range (the caller then ignores it and sends the whole file, per RFC 7233).
+    Raises ValueError when the range is valid but unsatisfiable: it starts
+    past the end of the file, or is an empty suffix.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    start_str, sep, end_str = spec.strip().partition("-")
+    if not sep:
+        return None
+    start_str, end_str = start_str.strip(), end_str.strip()
+    if not (start_str or end_str):
+        return None
+    if not all(part.isascii() and part.isdigit() for part in (start_str, end_str) if part):
+        return None
+
+    if not start_str:
+        # Suffix range: the last N bytes
+        suffix = int(end_str)
+        if suffix <= 0:
+            raise ValueError("Empty suffix range")
+        return max(0, file_size - suffix), file_size - 1
+
+    start = int(start_str)
+    if end_str and int(end_str) < start:
+        # Last byte before the first: invalid syntax, not unsatisfiable
+        return None
+    if start >= file_size:
+        raise ValueError("Range not satisfiable")
+    end = int(end_str) if end_str else file_size - 1
+    return start, min(end, file_size - 1)
+
+
+async def _iter_file_range(path: str, start: int, end: int) -> AsyncIterator[bytes]:
+    """Yield bytes [start, end] of a file in chunks."""
+    remaining = end - start + 1
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        while remaining > 0:
+            chunk = await f.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def range_file_response(
+    request: Request,
+    path: str,
+    media_type: str,
+    filename: str
+) -> Response:
+    """
+    Serve a file, honoring a single-range `Range` header.
+
+    Without a (usable) Range header this is a plain FileResponse that
+    advertises `Accept-Ranges: bytes`, so players know they can seek.
+
+    Args:
+        request: Incoming request (for the Range header)
+        path: File to serve
+        media_type: Content-Type of the file
+        filename: Download filename for Content-Disposition
+
+    Returns:
+        200 with the full file, 206 with the requested range, or 416
+    """
+    stat_result = os.stat(path)
+    file_size = stat_result.st_size
+    range_header = request.headers.get("range")
+
+    if range_header:
+        try:
+            byte_range = _parse_range(range_header, file_size)
+        except ValueError:
+            return Response(
+                status_code=416,
+                headers={"Content-Range": f"bytes */{file_size}", "Accept-Ranges": "bytes"}
+            )
+
+        if byte_range is not None:
+            start, end = byte_range
+            return StreamingResponse(
+                _iter_file_range(path, start, end),
+                status_code=206,
+                media_type=media_type,
+                headers={
+                    "Content-Range": f"bytes {start}-{end}/{file_size}",
+                    "Content-Length": str(end - start + 1),
+                    "Accept-Ranges": "bytes",
+                    "Content-Disposition": f'attachment; filename="{filename}"',
+                }
+            )
+
+    return FileResponse(
+        path=path,
+        media_type=media_type,
+        filename=filename,
+        stat_result=stat_result,
+        headers={"Accept-Ranges": "bytes"}
+    )
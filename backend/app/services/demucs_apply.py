@@ -0,0 +1,304 @@
+"""
+Batched segment inference for Demucs models.
+
+demucs.apply.apply_model runs the overlapping segments of a track through
+the model one at a time, which leaves most of a GPU idle. This module cuts
+the same segments (same padding, weighting and random shifts) but stacks
+them into mini-batches, and can mix segments from several tracks in one
+batch. Segments from all shifts are overlap-added into a single buffer per
+track and normalized by their summed weights.
+"""
+from functools import lru_cache
+from typing import Iterator, List, Optional, Tuple
+import logging
+import random
+
+try:
+    import torch
+    import torch.nn.functional as F
+except Exception:
+    torch = None
+    F = None
+
+logger = logging.getLogger(__name__)
+
+
+def apply_model_batched(
+    model,
+    mixes: List["torch.Tensor"],
+    segment: Optional[float] = None,
+    shifts: int = 1,
+    overlap: float = 0.25,
+    batch_size: int = 1,
+    device: str = "cpu",
+    transition_power: float = 1.0
+) -> List["torch.Tensor"]:
+    """
+    Separate one or more normalized mixes with a Demucs model.
+
+    Args:
+        model: HTDemucs model or BagOfModels
+        mixes: Tracks to separate, each (channels, samples)
+        segment: Segment length in seconds (None = the model's training segment)
+        shifts: Number of random time shifts to average (0 = no shift)
+        overlap: Overlap between consecutive segments
+        batch_size: Segments per forward pass
+        device: Device to run the model on
+        transition_power: Sharpness of the cross-fade between segments
+
+    Returns:
+        Per mix, a tensor of shape (sources, channels, samples)
+    """
+    sub_models = getattr(model, "models", None)
+    if sub_models is not None:
+        # Bag of models: per-source weighted average of each sub-model's estimate
+        estimates: List[Optional["torch.Tensor"]] = [None] * len(mixes)
+        totals = [0.0] * len(model.sources)
+        for sub_model, model_weights in zip(sub_models, model.weights):
+            outs = apply_model_batched(
+                sub_model, mixes, segment, shifts, overlap, batch_size, device, transition_power
+            )
+            for index, out in enumerate(outs):
+                for k, inst_weight in enumerate(model_weights):
+                    out[k] *= inst_weight
+                if estimates[index] is None:
+                    estimates[index] = out
+                else:
+                    estimates[index] += out
+            for k, inst_weight in enumerate(model_weights):
+                totals[k] += inst_weight
+            del outs
+        for estimate in estimates:
+            for k in range(estimate.shape[0]):
+                estimate[k] /= totals[k]
+        return estimates
+
+    model.to(device)
+    model.eval()
+
+    segment_length = int(model.samplerate * (segment or model.segment))
+    stride = int((1 - overlap) * segment_length)
+    weight = _transition_weight(segment_length, transition_power)
+
+    # Each shift of each mix is split independently; all of their segments
+    # share the mini-batches. A view is (mix index, offset of the mix within
+    # the view, samples).
+    max_shift = int(0.5 * model.samplerate) if shifts else 0
+    views: List[Tuple[int, int, "torch.Tensor"]] = []
+    for index, mix in enumerate(mixes):
+        if shifts:
+            padded = F.pad(mix, (max_shift, max_shift))
+            for _ in range(shifts):
+                offset = random.randint(0, max_shift)
+                views.append((index, max_shift - offset, padded[..., offset:mix.shape[-1] + max_shift]))
+        else:
+            views.append((index, 0, mix))
+
+    # One output and one weight buffer per mix, allocated up front: every
+    # segment of every shift is overlap-added in place, so memory stays flat
+    # regardless of track length or number of shifts
+    outs = [
+        torch.zeros(len(model.sources), *mix.shape, device=mix.device)
+        for mix in mixes
+    ]
+    sum_weights = [torch.zeros(mix.shape[-1], device=mix.device) for mix in mixes]
+
+    # While the GPU runs one batch, the previous batch's output (copied back
+    # asynchronously) is overlap-added on the CPU
+    pending = None
+    for batch in _iter_batches(_iter_segments(views, segment_length, stride), batch_size):
+        launched = _launch_batch(model, batch, device)
+        if pending is not None:
+            _overlap_add(*pending, views, weight, outs, sum_weights)
+        pending = launched
+    if pending is not None:
+        _overlap_add(*pending, views, weight, outs, sum_weights)
+
+    for out, sum_weight in zip(outs, sum_weights):
+        out.div_(sum_weight.clamp_min(1e-8))
+    return outs
+
+
+@lru_cache(maxsize=8)
+def _transition_weight(segment_length: int, transition_power: float) -> "torch.Tensor":
+    """
+    Triangular cross-fade weight, peaking mid-segment (as in demucs.apply).
+
+    Unlike a Hann window it is non-zero at the segment edges, so the first and
+    last samples of a track (covered by a single segment) keep their weight.
+    """
+    weight = torch.cat([
+        torch.arange(1, segment_length // 2 + 1),
+        torch.arange(segment_length - segment_length // 2, 0, -1)
+    ]).float()
+    return (weight / weight.max()) ** transition_power
+
+
+def _iter_segments(
+    views: List[Tuple[int, int, "torch.Tensor"]],
+    segment_length: int,
+    stride: int
+) -> Iterator[Tuple[int, int, int, "torch.Tensor"]]:
+    """
+    Yield (view_index, offset, length, padded_segment) for every segment.
+
+    Each segment is padded to segment_length with the audio around it (zeros
+    past the ends), so all segments stack into one batch.
+    """
+    for view_index, (_, _, view) in enumerate(views):
+        length = view.shape[-1]
+        for offset in range(0, length, stride):
+            chunk_length = min(segment_length, length - offset)
+            delta = segment_length - chunk_length
+            start = offset - delta // 2
+            end = start + segment_length
+            chunk = view[..., max(start, 0):min(end, length)]
+            chunk = F.pad(chunk, (max(0, -start), max(0, end - length)))
+            yield view_index, offset, chunk_length, chunk
+
+
+def _iter_batches(
+    segments: Iterator[Tuple[int, int, int, "torch.Tensor"]],
+    batch_size: int
+) -> Iterator[List[Tuple[int, int, int, "torch.Tensor"]]]:
+    """Group segments into lists of at most batch_size."""
+    batch = []
+    for item in segments:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _launch_batch(
+    model,
+    batch: List[Tuple[int, int, int, "torch.Tensor"]],
+    device: str
+) -> Tuple[List[Tuple[int, int, int, "torch.Tensor"]], "torch.Tensor", Optional["torch.cuda.Event"]]:
+    """
+    Start one stacked forward pass.
+
+    On CUDA the result is copied into pinned host memory with a non-blocking
+    copy and the returned event marks when it has landed; the caller does
+    other work before waiting on it. Pinned blocks are recycled by torch's
+    caching host allocator, so this doesn't pay for a fresh allocation per
+    batch.
+
+    Returns:
+        (batch, host-side outputs, copy event or None when already on the host)
+    """
+    inputs = torch.stack([chunk for *_, chunk in batch]).to(device)
+    chunk_outs = model(inputs)
+    if chunk_outs.device.type != "cuda":
+        return batch, chunk_outs, None
+
+    host_outs = torch.empty(chunk_outs.shape, dtype=chunk_outs.dtype, pin_memory=True)
+    host_outs.copy_(chunk_outs, non_blocking=True)
+    copied = torch.cuda.Event()
+    copied.record()
+    return batch, host_outs, copied
+
+
+def _overlap_add(
+    batch: List[Tuple[int, int, int, "torch.Tensor"]],
+    chunk_outs: "torch.Tensor",
+    copied: Optional["torch.cuda.Event"],
+    views: List[Tuple[int, int, "torch.Tensor"]],
+    weight: "torch.Tensor",
+    outs: List["torch.Tensor"],
+    sum_weights: List["torch.Tensor"]
+) -> None:
+    """Add each segment of a finished batch into its mix's output."""
+    if copied is not None:
+        copied.synchronize()
+    segment_length = batch[0][3].shape[-1]
+    for (view_index, offset, chunk_length, _), chunk_out in zip(batch, chunk_outs):
+        index, trim, _ = views[view_index]
+        out = outs[index]
+        # Center-trim the padded segment back to the audio it covers, then
+        # drop whatever falls in a shift's zero padding
+        start = (segment_length - chunk_length) // 2
+        begin = max(offset - trim, 0)
+        end = min(offset - trim + chunk_length, out.shape[-1])
+        if begin >= end:
+            continue
+        lo = start + begin - (offset - trim)
+        hi = lo + end - begin
+        chunk_weight = weight[lo - start:hi - start].to(out.device)
+        out[..., begin:end].add_(chunk_out[..., lo:hi].to(out.device) * chunk_weight)
+        sum_weights[index][begin:end].add_(chunk_weight)
+
+
+class CUDAGraphForward:
+    """
+    Drop-in replacement for a model's forward that replays a captured CUDA graph.
+
+    The segment forward has a fixed shape once segments are padded, and is
+    made of many small kernels whose launch overhead dominates at small batch
+    sizes. The forward is captured once per input shape and replayed with the
+    new inputs copied into the captured buffer. Partial batches are
+    zero-padded to batch_size so the trailing batch reuses the same graph.
+
+    Anything that can't be captured (CPU inputs, larger batches, a failed
+    capture) runs the original forward instead.
+    """
+
+    # Graphs replay one at a time, so all of them can share one memory pool
+    _pool = None
+
+    def __init__(self, forward, batch_size: int):
+        """
+        Args:
+            forward: The model's original forward method
+            batch_size: Batch size to capture (smaller batches are padded up to it)
+        """
+        self._forward = forward
+        self._batch_size = batch_size
+        # input shape -> (graph, static input, static output)
+        self._graphs = {}
+        self._disabled = False
+
+    def __call__(self, inputs):
+        count = inputs.shape[0]
+        if self._disabled or inputs.device.type != "cuda" or count > self._batch_size:
+            return self._forward(inputs)
+
+        if count < self._batch_size:
+            inputs = F.pad(inputs, (0, 0, 0, 0, 0, self._batch_size - count))
+
+        key = tuple(inputs.shape)
+        if key not in self._graphs:
+            try:
+                self._graphs[key] = self._capture(inputs)
+            except Exception as e:
+                logger.warning(f"CUDA graph capture failed ({e}); running the model eagerly")
+                self._disabled = True
+                return self._forward(inputs[:count])
+
+        graph, static_in, static_out = self._graphs[key]
+        static_in.copy_(inputs)
+        graph.replay()
+        # Later replays overwrite static_out, but they're queued on the same
+        # stream after anything the caller enqueues to read this one
+        return static_out[:count]
+
+    def _capture(self, inputs):
+        static_in = inputs.clone()
+
+        # Warm up on a side stream (cuDNN autotuning, lazy init) before capturing
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(stream):
+            for _ in range(3):
+                self._forward(static_in)
+        torch.cuda.current_stream().wait_stream(stream)
+
+        if CUDAGraphForward._pool is None:
+            CUDAGraphForward._pool = torch.cuda.graph_pool_handle()
+        graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(graph, pool=CUDAGraphForward._pool):
+            static_out = self._forward(static_in)
+        logger.info(f"Captured CUDA graph for input shape {tuple(inputs.shape)}")
+        return graph, static_in, static_out
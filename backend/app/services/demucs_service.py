@@ -1,20 +1,33 @@
 """Demucs audio separation service"""
-from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
 import logging
+import multiprocessing
+import os
+import threading
 import soundfile as sf
 
+try:
+    import torch
+except Exception:
+    torch = None
+
 try:
     import demucs.api as demucs_api
+    from demucs.audio import convert_audio
 except Exception as import_error:  # pragma: no cover - environment dependent
     demucs_api = None
+    convert_audio = None
     _demucs_import_error = import_error
     logger = logging.getLogger(__name__)
     logger.warning("Demucs import failed: %s", import_error)
 
 from app.config import settings
+from app.services.demucs_apply import CUDAGraphForward, apply_model_batched
+from app.services.system_detector import get_system_capabilities
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +45,235 @@ def get_executor() -> ThreadPoolExecutor:
     return _executor
 
 
+# Stem encoding/writing, off the inference thread. libsndfile releases the
+# GIL while encoding, so a job's stems are written in parallel.
+_io_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """Get or create the thread pool that writes stem files."""
+    global _io_executor
+    if _io_executor is None:
+        _io_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="stem-writer")
+    return _io_executor
+
+
+# Worker processes for CPU separations
+_process_pool: Optional[ProcessPoolExecutor] = None
+# One single-process pool per GPU on multi-GPU hosts, and the jobs each one has in flight
+_gpu_pools: Optional[List[ProcessPoolExecutor]] = None
+_gpu_pool_load: List[int] = []
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Get or create the process pool used for CPU separations.
+
+    On CPU, the Python around the torch kernels (audio loading, segment
+    splitting, stem writing) holds the GIL, so concurrent jobs on threads
+    contend for it. Each pool process has its own interpreter and keeps its
+    own loaded models. Single-GPU jobs stay on the thread pool; see
+    get_gpu_pools() for multi-GPU hosts.
+    """
+    global _process_pool
+    if _process_pool is None:
+        capabilities = get_system_capabilities(force_cpu=settings.force_cpu)
+        _process_pool = ProcessPoolExecutor(
+            # One process (and one loaded model) per job the workers run at once
+            max_workers=capabilities.max_concurrent_jobs,
+            # Spawn rather than fork so no torch/OpenMP state is inherited
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker_process,
+            initargs=(capabilities.cpu_cores, capabilities.max_concurrent_jobs)
+        )
+    return _process_pool
+
+
+def get_gpu_pools() -> List[ProcessPoolExecutor]:
+    """
+    Get or create one worker process per GPU (empty with fewer than two GPUs).
+
+    Each process sees only its own GPU (CUDA_VISIBLE_DEVICES) and keeps its
+    own loaded models, so jobs on different GPUs run fully in parallel, GIL
+    included. With a single GPU, jobs share the in-process service instead,
+    which lets the batcher stack them.
+    """
+    global _gpu_pools, _gpu_pool_load
+    if _gpu_pools is None:
+        gpu_count = torch.cuda.device_count() if torch is not None else 0
+        if gpu_count < 2:
+            _gpu_pools = []
+        else:
+            # Respect a parent CUDA_VISIBLE_DEVICES: rank i gets its i-th entry
+            visible = os.environ.get("CUDA_VISIBLE_DEVICES")
+            device_ids = visible.split(",") if visible else [str(i) for i in range(gpu_count)]
+            _gpu_pools = [
+                ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_gpu_process,
+                    initargs=(device_ids[rank].strip(),)
+                )
+                for rank in range(gpu_count)
+            ]
+            logger.info(f"Started one separation process per GPU ({gpu_count} GPUs)")
+        _gpu_pool_load = [0] * len(_gpu_pools)
+    return _gpu_pools
+
+
+def uses_worker_processes(device: str) -> bool:
+    """Whether jobs on this device run in worker processes rather than the thread pool."""
+    return device == "cpu" or bool(get_gpu_pools())
+
+
+def shutdown_process_pool() -> None:
+    """Shut down the CPU and per-GPU process pools if they were started."""
+    global _process_pool, _gpu_pools
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+        _process_pool = None
+    for pool in _gpu_pools or []:
+        pool.shutdown(wait=True, cancel_futures=True)
+    _gpu_pools = None
+
+
+def _init_worker_process(cpu_cores: int, num_workers: int) -> None:
+    """
+    Set up a freshly spawned pool process.
+
+    Torch defaults to one intra-op thread per logical core in every process,
+    which oversubscribes hyperthreaded cores once several workers run. Each
+    process gets an equal share of the physical cores for intra-op work and
+    a single inter-op thread (the segment forward has no independent ops to
+    run side by side).
+
+    Args:
+        cpu_cores: Physical cores on the machine (SystemCapabilities.cpu_cores)
+        num_workers: Number of separations running at once
+    """
+    logging.basicConfig(level=logging.INFO)
+    threads = max(1, cpu_cores // num_workers)
+    # Read by OpenMP/MKL when their thread pools start
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    if torch is not None:
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError as e:
+            # Only allowed before any inter-op work has started in this process
+            logger.warning(f"Could not set inter-op threads: {e}")
+
+
+def _init_gpu_process(device_id: str) -> None:
+    """Bind a freshly spawned process to one GPU (before CUDA is initialized in it)."""
+    os.environ["CUDA_VISIBLE_DEVICES"] = device_id
+    logging.basicConfig(level=logging.INFO)
+
+
+def preload_model(
+    model: str,
+    device: str,
+    segment: Optional[int],
+    overlap: float,
+    precision: str = "fp32",
+    batch_size: int = 1
+) -> None:
+    """Load a model into the calling process's service cache (used to warm pool processes)."""
+    get_demucs_service(model, device, segment, overlap, precision, batch_size)
+
+
+def _separate_in_worker(
+    model: str,
+    device: str,
+    segment: Optional[int],
+    overlap: float,
+    precision: str,
+    batch_size: int,
+    input_path: str,
+    output_dir: str,
+    job_id: str,
+    shifts: int
+) -> Dict[str, Optional[str]]:
+    """Run one separation inside a pool process, reusing that process's loaded model."""
+    service = get_demucs_service(model, device, segment, overlap, precision, batch_size)
+    return service._separate_sync(input_path, output_dir, job_id, shifts)
+
+
+async def separate_audio_in_process(
+    model: str,
+    device: str,
+    segment: Optional[int],
+    overlap: float,
+    input_path: str,
+    output_dir: str,
+    job_id: str,
+    shifts: int = 1,
+    precision: str = "fp32",
+    batch_size: int = 1
+) -> Dict[str, Optional[str]]:
+    """
+    Separate an audio file in a worker process.
+
+    CPU jobs go to the CPU process pool; GPU jobs go to the
+    least-loaded per-GPU process (see uses_worker_processes()).
+
+    Args:
+        model: Model name (htdemucs, htdemucs_ft, htdemucs_6s)
+        device: "cuda" or "cpu"
+        segment: Segment size for memory-constrained systems (None = full song)
+        overlap: Overlap between segments
+        input_path: Path to input audio file
+        output_dir: Directory to save separated stems
+        job_id: Unique job identifier
+        shifts: Quality parameter (1=fast, 2-5=higher quality)
+        precision: Inference precision on GPU ("bf16", "fp16" or "fp32")
+        batch_size: Demucs segments per forward pass
+
+    Returns:
+        Dictionary mapping stem names to output file paths (None for unavailable stems)
+    """
+    gpu_index = None
+    if device == "cpu":
+        pool = get_process_pool()
+    else:
+        gpu_pools = get_gpu_pools()
+        # Least-loaded GPU, so a job never waits behind a busy one while another is idle
+        gpu_index = min(range(len(gpu_pools)), key=_gpu_pool_load.__getitem__)
+        pool = gpu_pools[gpu_index]
+
+    logger.info(f"Starting separation for job {job_id} in worker process: {input_path}")
+
+    job_output_dir = os.path.join(output_dir, job_id)
+    os.makedirs(job_output_dir, exist_ok=True)
+
+    loop = asyncio.get_running_loop()
+    if gpu_index is not None:
+        # Only touched from the event loop, so no lock is needed
+        _gpu_pool_load[gpu_index] += 1
+    try:
+        stem_to_path = await loop.run_in_executor(
+            pool,
+            _separate_in_worker,
+            model,
+            device,
+            segment,
+            overlap,
+            precision,
+            batch_size,
+            input_path,
+            job_output_dir,
+            job_id,
+            shifts
+        )
+    finally:
+        if gpu_index is not None:
+            _gpu_pool_load[gpu_index] -= 1
+
+    logger.info(f"Separation completed for job {job_id}: {len(stem_to_path)} stems")
+    return stem_to_path
+
+
 class DemucsService:
     """Service for separating audio tracks using Demucs"""
 
@@ -40,28 +282,37 @@ class DemucsService:
         model: str = "htdemucs_ft",
         device: str = "cuda",
         segment: Optional[int] = None,
-        shifts: int = 1,
-        overlap: float = 0.25
+        overlap: float = 0.25,
+        precision: str = "fp32",
+        batch_size: int = 1
     ):
         """
         Initialize Demucs service with configurable parameters.
 
+        Loads the model weights, so instances are shared across jobs via
+        get_demucs_service() rather than created per job.
+
         Args:
             model: Model name (htdemucs, htdemucs_ft, htdemucs_6s)
             device: "cuda" or "cpu"
             segment: Segment size for memory-constrained systems (None = full song)
-            shifts: Quality parameter (1=fast, 2-5=higher quality)
             overlap: Overlap between segments (0.25 = 25%)
+            precision: "bf16", "fp16" or "fp32" (see SystemDetector._recommend_precision)
+            batch_size: Segments stacked into each forward pass
         """
         self.model_name = model
         self.device = device
         self.segment = segment
-        self.shifts = shifts
         self.overlap = overlap
+        self.precision = precision
+        self.batch_size = batch_size
+        # Runs on a shared service are serialized so concurrent jobs don't
+        # compete for the same device memory
+        self._lock = threading.Lock()
 
         logger.info(
             f"Initializing DemucsService: model={model}, device={device}, "
-            f"segment={segment}, shifts={shifts}"
+            f"segment={segment}, precision={precision}, batch_size={batch_size}"
         )
 
         # Initialize Demucs separator
@@ -76,21 +327,92 @@ class DemucsService:
                 model=model,
                 device=device,
                 segment=segment,
-                shifts=shifts,
                 overlap=overlap,
                 progress=True  # Enable progress tracking
             )
+            # Inference only: fix dropout/norm layers and drop autograd bookkeeping
+            # on the weights once, rather than relying on every call site
+            self.separator.model.eval()
+            self.separator.model.requires_grad_(False)
             logger.info(f"Demucs separator initialized successfully")
         except Exception as e:
             logger.error(f"Error initializing Demucs: {e}")
             raise
 
+        # Autocast the forward passes to bf16/fp16 on tensor-core GPUs. Weights stay
+        # fp32, so autocast keeps the STFT and normalization in full precision.
+        self._amp_dtype = None
+        if torch is not None and device == "cuda":
+            # Demucs feeds fixed-size segments, so cuDNN's autotuned kernels get reused
+            torch.backends.cudnn.benchmark = True
+            # NHWC lets cuDNN pick tensor-core kernels for the frequency branch.
+            # Only the 4D Conv2d weights change layout; the spectrogram they see
+            # is built inside the model, so inputs stay as they are.
+            for sub_model in getattr(self.separator.model, "models", [self.separator.model]):
+                sub_model.to(memory_format=torch.channels_last)
+            if settings.demucs_mixed_precision and precision != "fp32":
+                self._amp_dtype = torch.bfloat16 if precision == "bf16" else torch.float16
+                logger.info(f"Using {precision} autocast for Demucs inference")
+
+        # torch.compile's reduce-overhead mode already replays CUDA graphs
+        self._cuda_graphs = False
+        if settings.demucs_compile:
+            self._compile_model()
+        elif settings.demucs_cuda_graphs and device == "cuda" and torch is not None:
+            self._use_cuda_graphs()
+
+    def _compile_model(self) -> None:
+        """
+        Compile the model's forward passes with torch.compile (opt-in).
+
+        Only `forward` is swapped for its compiled version, so the modules keep
+        their type and attributes (samplerate, segment, sources, the bag's
+        models and weights). Compilation happens lazily on the first run; see
+        warmup().
+        """
+        if torch is None or not hasattr(torch, "compile"):
+            logger.warning("torch.compile unavailable (needs torch>=2.0); running uncompiled")
+            return
+
+        model = self.separator.model
+        # Bags (e.g. htdemucs_ft) hold one sub-model per stem
+        sub_models = getattr(model, "models", [model])
+        for sub_model in sub_models:
+            sub_model.forward = torch.compile(sub_model.forward, mode="reduce-overhead")
+        logger.info(f"Compiled {len(sub_models)} Demucs model(s) with torch.compile")
+
+    def _use_cuda_graphs(self) -> None:
+        """
+        Replay each sub-model's forward from a captured CUDA graph (opt-in).
+
+        Graphs are captured on first use per input shape; see warmup().
+        """
+        model = self.separator.model
+        sub_models = getattr(model, "models", [model])
+        for sub_model in sub_models:
+            # Weights must already live on the GPU when the graph is captured
+            sub_model.to(self.device)
+            sub_model.forward = CUDAGraphForward(sub_model.forward, self.batch_size)
+        self._cuda_graphs = True
+        logger.info(f"Using CUDA graphs for {len(sub_models)} Demucs model(s)")
+
+    def warmup(self) -> None:
+        """Run one second of silence through the model so compilation/autotuning happens now."""
+        if torch is None:
+            return
+        # One full batch of one-segment inputs, so the compiled graph sees the batch shape
+        silence = torch.zeros(self.separator.audio_channels, self.separator.samplerate)
+        with self._inference_context():
+            self._apply([silence] * self.batch_size, shifts=0)
+        logger.info(f"Warmed up Demucs model {self.model_name}")
+
     async def separate_audio(
         self,
-        input_path: Path,
-        output_dir: Path,
-        job_id: str
-    ) -> Dict[str, Optional[Path]]:
+        input_path: str,
+        output_dir: str,
+        job_id: str,
+        shifts: int = 1
+    ) -> Dict[str, Optional[str]]:
         """
         Separate an audio file into stems.
 
@@ -98,6 +420,7 @@ class DemucsService:
             input_path: Path to input audio file
             output_dir: Directory to save separated stems
             job_id: Unique job identifier
+            shifts: Quality parameter (1=fast, 2-5=higher quality)
 
         Returns:
             Dictionary mapping stem names to output file paths (None for unavailable stems)
@@ -105,8 +428,8 @@ class DemucsService:
         logger.info(f"Starting separation for job {job_id}: {input_path}")
 
         # Create job output directory
-        job_output_dir = Path(output_dir) / job_id
-        job_output_dir.mkdir(parents=True, exist_ok=True)
+        job_output_dir = os.path.join(output_dir, job_id)
+        os.makedirs(job_output_dir, exist_ok=True)
 
         # Run separation in thread pool to avoid blocking event loop
         loop = asyncio.get_running_loop()
@@ -115,7 +438,8 @@ class DemucsService:
             self._separate_sync,
             input_path,
             job_output_dir,
-            job_id
+            job_id,
+            shifts
         )
 
         logger.info(f"Separation completed for job {job_id}: {len(stem_to_path)} stems")
@@ -123,10 +447,11 @@ class DemucsService:
 
     def _separate_sync(
         self,
-        input_path: Path,
-        output_dir: Path,
-        job_id: str
-    ) -> Dict[str, Optional[Path]]:
+        input_path: str,
+        output_dir: str,
+        job_id: str,
+        shifts: int = 1
+    ) -> Dict[str, Optional[str]]:
         """
         Synchronous separation (runs in thread pool).
 
@@ -134,49 +459,212 @@ class DemucsService:
             input_path: Path to input audio file
             output_dir: Directory to save separated stems
             job_id: Unique job identifier
+            shifts: Quality parameter (1=fast, 2-5=higher quality)
 
         Returns:
             Dictionary mapping stem names to output file paths (None for unavailable stems)
         """
         try:
             # Run Demucs separation
-            logger.info(f"Running Demucs separation for job {job_id}")
-            _, separated = self.separator.separate_audio_file(str(input_path))
-
-            stem_to_path = {}
-
-            # Process separated stems (separated is a dict of stem_name -> audio_tensor)
-            for stem_name, audio_tensor in separated.items():
-                # Save as WAV with high quality
-                output_path = output_dir / f"{stem_name}.wav"
-
-                # Convert tensor to numpy and save using soundfile
-                # audio_tensor shape: (channels, samples)
-                audio_np = audio_tensor.cpu().numpy()
-                # Transpose to (samples, channels) for soundfile
-                audio_np = audio_np.T
-
-                # Save as 16-bit WAV
-                sf.write(
-                    str(output_path),
-                    audio_np,
-                    self.separator.samplerate,
-                    subtype='PCM_16'
-                )
+            logger.info(f"Running Demucs separation for job {job_id} (shifts={shifts})")
+            wav = self._load_audio(input_path)
+            mean, std = self._normalization_stats(wav)
+            with self._inference_context():
+                out = self._apply([wav.sub_(mean).div_(std)], shifts)[0]
+                # In place (and inside inference mode, where the output was created)
+                out = self._to_pcm16(out.mul_(std).add_(mean))
+            del wav
+
+            separated = dict(zip(self.separator.model.sources, out))
+            return self._write_stems(separated, output_dir)
+
+        except Exception as e:
+            logger.error(f"Error during separation: {e}")
+            raise
+
+    async def separate_audio_batch(
+        self,
+        input_paths: List[str],
+        output_dir: str,
+        job_ids: List[str],
+        shifts: int = 1
+    ) -> List[Dict[str, Optional[str]]]:
+        """
+        Separate several audio files in one batched model run.
+
+        Args:
+            input_paths: Paths to the input audio files
+            output_dir: Directory to save separated stems (one subdirectory per job)
+            job_ids: Job identifier for each input
+            shifts: Quality parameter (1=fast, 2-5=higher quality)
+
+        Returns:
+            Per input, a dictionary mapping stem names to output file paths
+        """
+        logger.info(f"Starting batched separation for jobs {', '.join(job_ids)}")
+
+        job_output_dirs = [os.path.join(output_dir, job_id) for job_id in job_ids]
+        for job_output_dir in job_output_dirs:
+            os.makedirs(job_output_dir, exist_ok=True)
 
-                stem_to_path[stem_name] = output_path
-                logger.info(f"Saved {stem_name} to {output_path}")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_executor(),
+            self._separate_batch_sync,
+            input_paths,
+            job_output_dirs,
+            shifts
+        )
+
+    def _separate_batch_sync(
+        self,
+        input_paths: List[str],
+        output_dirs: List[str],
+        shifts: int = 1
+    ) -> List[Dict[str, Optional[str]]]:
+        """
+        Synchronous batched separation (runs in thread pool).
 
-            # Map stems to frontend format
-            stem_to_path = self.map_stems_to_frontend(stem_to_path)
+        Each track is normalized separately (as Separator.separate_tensor
+        does), then the segments of all tracks share the forward passes.
+        """
+        try:
+            wavs = [self._load_audio(path) for path in input_paths]
+            stats = [self._normalization_stats(wav) for wav in wavs]
 
-            return stem_to_path
+            with self._inference_context():
+                outs = self._apply(
+                    [wav.sub_(mean).div_(std) for wav, (mean, std) in zip(wavs, stats)],
+                    shifts
+                )
+                outs = [
+                    self._to_pcm16(out.mul_(std).add_(mean))
+                    for out, (mean, std) in zip(outs, stats)
+                ]
+            del wavs
+
+            results = []
+            for out, job_output_dir in zip(outs, output_dirs):
+                separated = dict(zip(self.separator.model.sources, out))
+                results.append(self._write_stems(separated, job_output_dir))
+            return results
 
         except Exception as e:
-            logger.error(f"Error during separation: {e}")
+            logger.error(f"Error during batched separation: {e}")
             raise
 
-    def map_stems_to_frontend(self, stems: Dict[str, Path]) -> Dict[str, Optional[Path]]:
+    def _load_audio(self, input_path: str):
+        """
+        Decode an input file to a (channels, samples) tensor at the model's rate.
+
+        Formats libsndfile reads (WAV, FLAC, OGG, and MP3 with libsndfile 1.1+)
+        are decoded in-process; anything else goes through demucs' loader,
+        which shells out to ffmpeg.
+        """
+        try:
+            data, samplerate = sf.read(input_path, dtype="float32", always_2d=True)
+        except Exception:
+            return self.separator._load_audio(input_path)
+
+        wav = torch.from_numpy(data.T)
+        # convert_audio upmixes mono with expand(), a view whose channels share
+        # memory; the in-place normalization needs a real (channels, samples) tensor
+        return convert_audio(
+            wav,
+            samplerate,
+            self.separator.samplerate,
+            self.separator.audio_channels
+        ).contiguous()
+
+    @staticmethod
+    def _normalization_stats(wav) -> tuple:
+        """Mean and std of the mono mixdown, used to normalize the model input."""
+        ref = wav.mean(0)
+        return ref.mean(), ref.std() + 1e-8
+
+    @staticmethod
+    def _to_pcm16(out):
+        """
+        Quantize all stems of a track (stacked, so one pass) to int16.
+
+        Halves the memory held while the stems are written, and clamping here
+        keeps clipped peaks from wrapping around in libsndfile's own
+        float-to-PCM conversion.
+        """
+        return out.clamp_(-1.0, 1.0).mul_(32767).round_().to(torch.int16)
+
+    def _apply(self, mixes: List, shifts: int) -> List:
+        """Run normalized mixes through the model in batched segments."""
+        return apply_model_batched(
+            self.separator.model,
+            mixes,
+            segment=self.segment,
+            shifts=shifts,
+            overlap=self.overlap,
+            batch_size=self.batch_size,
+            device=self.device
+        )
+
+    @contextlib.contextmanager
+    def _inference_context(self):
+        """Hold the shared separator and run under inference_mode (plus autocast when enabled)."""
+        # inference_mode skips autograd bookkeeping for the forward passes
+        no_grad = torch.inference_mode() if torch is not None else contextlib.nullcontext()
+        # Autocast's weight-cast cache doesn't survive graph capture/replay
+        autocast = (
+            torch.autocast(self.device, dtype=self._amp_dtype, cache_enabled=not self._cuda_graphs)
+            if self._amp_dtype is not None else contextlib.nullcontext()
+        )
+        with self._lock, no_grad, autocast:
+            yield
+
+    def _write_stems(self, separated: Dict, output_dir: str) -> Dict[str, Optional[str]]:
+        """
+        Write separated stem tensors to disk.
+
+        Args:
+            separated: Dictionary of stem_name -> int16 audio tensor (channels, samples)
+            output_dir: Directory to save the stems
+
+        Returns:
+            Dictionary mapping stem names to output file paths (None for unavailable stems)
+        """
+        stem_to_path = {}
+        writes = []
+
+        # Process separated stems (separated is a dict of stem_name -> audio_tensor)
+        for stem_name, audio_tensor in separated.items():
+            # Save as FLAC: lossless, and roughly half the size of WAV to store and serve
+            output_path = os.path.join(output_dir, f"{stem_name}.flac")
+
+            # Convert tensor to numpy and save using soundfile
+            # audio_tensor shape: (channels, samples), already quantized by _to_pcm16
+            audio_np = audio_tensor.cpu().numpy()
+            # Transpose to (samples, channels) for soundfile
+            audio_np = audio_np.T
+
+            # Save as 16-bit FLAC
+            writes.append(get_io_executor().submit(
+                sf.write,
+                output_path,
+                audio_np,
+                self.separator.samplerate,
+                format='FLAC',
+                subtype='PCM_16'
+            ))
+
+            stem_to_path[stem_name] = output_path
+
+        for future, (stem_name, output_path) in zip(writes, stem_to_path.items()):
+            future.result()
+            logger.info(f"Saved {stem_name} to {output_path}")
+
+        # Map stems to frontend format
+        stem_to_path = self.map_stems_to_frontend(stem_to_path)
+
+        return stem_to_path
+
+    def map_stems_to_frontend(self, stems: Dict[str, str]) -> Dict[str, Optional[str]]:
         """
         Map Demucs stem names to frontend expected format.
 
@@ -221,6 +709,52 @@ class DemucsService:
             "model": self.model_name,
             "device": self.device,
             "segment": self.segment,
-            "shifts": self.shifts,
-            "overlap": self.overlap
+            "overlap": self.overlap,
+            "precision": self.precision,
+            "batch_size": self.batch_size
         }
+
+
+_service_lock = threading.Lock()
+
+
+@lru_cache(maxsize=4)
+def _load_service(
+    model: str,
+    device: str,
+    segment: Optional[int],
+    overlap: float,
+    precision: str,
+    batch_size: int
+) -> DemucsService:
+    service = DemucsService(
+        model=model,
+        device=device,
+        segment=segment,
+        overlap=overlap,
+        precision=precision,
+        batch_size=batch_size
+    )
+    if settings.demucs_compile or service._cuda_graphs:
+        # Pay the compile/capture cost here (at startup pre-warm) rather than in the first job
+        service.warmup()
+    return service
+
+
+def get_demucs_service(
+    model: str,
+    device: str,
+    segment: Optional[int],
+    overlap: float,
+    precision: str = "fp32",
+    batch_size: int = 1
+) -> DemucsService:
+    """
+    Get a loaded DemucsService for this configuration, creating it on first use.
+
+    Weights are loaded once per configuration and reused by
+    later jobs. Blocks while loading, so call it from the thread pool.
+    """
+    # The lock keeps concurrent jobs from loading the same model twice
+    with _service_lock:
+        return _load_service(model, device, segment, overlap, precision, batch_size)
@@ -0,0 +1,103 @@
+"""Shared async HTTP client for upstream APIs (Genius, lrclib)."""
+import asyncio
+import logging
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Optional
+
+import httpx
+from fastapi import Request
+
+logger = logging.getLogger(__name__)
+
+# Upstream responses that are worth retrying (rate limited or temporarily down)
+RETRYABLE_STATUS_CODES = frozenset({429, 502, 503, 504})
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Create the application-wide HTTP client.
+
+    HTTP/2 lets the concurrent Genius calls made by a single lyrics request
+    share one TCP+TLS connection instead of opening one each.
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(15.0),
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+    )
+
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    """FastAPI dependency returning the client created in the app lifespan."""
+    return request.app.state.http
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+async def get_with_retry(
+    client: httpx.AsyncClient,
+    url: str,
+    attempts: int = 3,
+    base_delay: float = 1.0,
+    max_delay: float = 30.0,
+    **kwargs: Any
+) -> httpx.Response:
+    """
+    GET a URL, retrying transport errors and 429/5xx responses.
+
+    Waits grow exponentially from base_delay with random jitter, capped at
+    max_delay. A Retry-After header on the response is honored when it asks
+    for a longer wait; if it asks for more than max_delay the response is
+    returned as-is instead of holding the request open.
+
+    Args:
+        client: HTTP client to issue the request with
+        url: URL to fetch
+        attempts: Maximum number of attempts (including the first)
+        base_delay: Delay before the first retry, in seconds
+        max_delay: Upper bound for any single wait, in seconds
+        **kwargs: Passed through to client.get
+
+    Returns:
+        The last response received (callers still call raise_for_status)
+
+    Raises:
+        httpx.TransportError: If the final attempt failed to connect or timed out
+    """
+    for attempt in range(1, attempts):
+        backoff = min(max_delay, base_delay * 2 ** (attempt - 1) + random.uniform(0, base_delay))
+        try:
+            resp = await client.get(url, **kwargs)
+        except httpx.TransportError as e:
+            logger.warning(f"GET {url} failed ({e!r}), retrying in {backoff:.1f}s")
+            await asyncio.sleep(backoff)
+            continue
+
+        if resp.status_code not in RETRYABLE_STATUS_CODES:
+            return resp
+
+        retry_after = _parse_retry_after(resp.headers.get("Retry-After"))
+        if retry_after is not None and retry_after > max_delay:
+            return resp
+        delay = max(backoff, retry_after or 0.0)
+        logger.warning(f"GET {url} returned {resp.status_code}, retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+    return await client.get(url, **kwargs)
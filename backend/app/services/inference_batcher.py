@@ -0,0 +1,126 @@
+"""
+Coalescing batcher for Demucs separations.
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.services.demucs_service import DemucsService
+
+logger = logging.getLogger(__name__)
+
+# (input_path, job_id, future resolved with that job's stems)
+_Request = Tuple[str, str, asyncio.Future]
+
+
+class InferenceBatcher:
+    """
+    Collects separations that arrive within a short window and runs the ones
+    sharing a model and settings as a single batched forward pass.
+
+    At batch size 1 the GPU is underutilized, so when several jobs run at
+    once, stacking them along the batch dimension gets more total throughput
+    than separate runs. A lone job is run directly, as before.
+    """
+
+    def __init__(self, window: float = 0.05, max_batch: int = 2):
+        """
+        Args:
+            window: Seconds to wait for more jobs after the first one arrives
+            max_batch: Maximum number of jobs in one forward pass
+        """
+        self._window = window
+        self._max_batch = max_batch
+        self._queue: asyncio.Queue[Tuple[DemucsService, int, str, _Request]] = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        """Start the background task that drains the separation queue."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop draining and cancel any separations still in progress."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for task in list(self._inflight):
+            task.cancel()
+        await asyncio.gather(*self._inflight, return_exceptions=True)
+        while not self._queue.empty():
+            *_, (_, _, future) = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
+
+    async def separate(
+        self,
+        service: DemucsService,
+        input_path: str,
+        output_dir: str,
+        job_id: str,
+        shifts: int
+    ) -> Dict[str, Optional[str]]:
+        """
+        Separate one file, possibly batched with other pending jobs.
+
+        Returns:
+            Dictionary mapping stem names to output file paths (None for unavailable stems)
+        """
+        if self._max_batch <= 1:
+            return await service.separate_audio(input_path, output_dir, job_id, shifts)
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((service, shifts, output_dir, (input_path, job_id, future)))
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            await asyncio.sleep(self._window)
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            groups: Dict[Tuple[DemucsService, int, str], List[_Request]] = {}
+            for service, shifts, output_dir, request in batch:
+                groups.setdefault((service, shifts, output_dir), []).append(request)
+
+            for (service, shifts, output_dir), requests in groups.items():
+                for i in range(0, len(requests), self._max_batch):
+                    task = asyncio.create_task(
+                        self._dispatch(service, shifts, output_dir, requests[i:i + self._max_batch])
+                    )
+                    self._inflight.add(task)
+                    task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(
+        self,
+        service: DemucsService,
+        shifts: int,
+        output_dir: str,
+        requests: List[_Request]
+    ) -> None:
+        if len(requests) > 1:
+            input_paths = [path for path, _, _ in requests]
+            job_ids = [job_id for _, job_id, _ in requests]
+            try:
+                results = await service.separate_audio_batch(input_paths, output_dir, job_ids, shifts)
+            except Exception as e:
+                # One bad input shouldn't fail the others; fall back to one at a time
+                logger.warning(f"Batched separation failed ({e}); retrying jobs individually")
+            else:
+                for (_, _, future), result in zip(requests, results):
+                    if not future.done():
+                        future.set_result(result)
+                return
+
+        for input_path, job_id, future in requests:
+            try:
+                result = await service.separate_audio(input_path, output_dir, job_id, shifts)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
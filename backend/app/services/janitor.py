@@ -0,0 +1,85 @@
+"""
+Background janitor that deletes job directories off the request/job path.
+"""
+from pathlib import Path
+from typing import Optional
+import logging
+import os
+import queue
+import shutil
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+TRASH_DIR_NAME = ".trash"
+
+# Directories waiting to be deleted; None tells the janitor to exit
+_cleanup_q: "queue.SimpleQueue[Optional[Path]]" = queue.SimpleQueue()
+_thread: Optional[threading.Thread] = None
+
+
+def remove_later(path: Path) -> None:
+    """
+    Schedule a directory for deletion and return immediately.
+
+    The directory is first renamed into a `.trash` folder next to it (a
+    single atomic rename), so it disappears from its original location
+    right away; the recursive delete happens on the janitor thread.
+    """
+    target = path
+    trash_dir = path.parent / TRASH_DIR_NAME
+    try:
+        trash_dir.mkdir(exist_ok=True)
+        target = trash_dir / uuid.uuid4().hex
+        os.rename(path, target)
+    except FileNotFoundError:
+        return
+    except OSError as e:
+        logger.warning(f"Could not move {path} to trash, deleting in place: {e}")
+        target = path
+    _cleanup_q.put(target)
+
+
+def _janitor() -> None:
+    """Delete queued directories one at a time until told to stop."""
+    while True:
+        path = _cleanup_q.get()
+        if path is None:
+            return
+        try:
+            shutil.rmtree(path, ignore_errors=True)
+        except Exception as e:
+            logger.warning(f"Janitor failed to remove {path}: {e}")
+
+
+def start(*roots: Path) -> None:
+    """
+    Start the janitor thread.
+
+    Args:
+        roots: Directories whose `.trash` folders are emptied on startup
+            (leftovers from a previous run that exited before cleaning up)
+    """
+    global _thread
+    if _thread is not None:
+        return
+
+    for root in roots:
+        trash_dir = root / TRASH_DIR_NAME
+        if trash_dir.is_dir():
+            for leftover in trash_dir.iterdir():
+                _cleanup_q.put(leftover)
+
+    _thread = threading.Thread(target=_janitor, name="janitor", daemon=True)
+    _thread.start()
+
+
+def stop(timeout: float = 5.0) -> None:
+    """Let the janitor finish what's queued (up to `timeout` seconds), then stop it."""
+    global _thread
+    if _thread is None:
+        return
+    _cleanup_q.put(None)
+    _thread.join(timeout)
+    _thread = None
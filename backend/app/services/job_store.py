@@ -1,15 +1,22 @@
 """
 Job storage service for tracking audio separation jobs.
 """
-import json
+import asyncio
+import contextlib
+import heapq
+import os
+import sqlite3
 import threading
-from dataclasses import dataclass, asdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Tuple
 import logging
 
+import orjson
+
 logger = logging.getLogger(__name__)
 
 
@@ -37,17 +44,31 @@ class Job:
     stems: Optional[Dict[str, Optional[str]]] = None  # stem_name -> Optional[file_path], None if unavailable
     error_message: Optional[str] = None
     processing_time: Optional[float] = None  # seconds
+    content_key: Optional[str] = None  # "<input hash>:<model>:<quality>", for dedup
+    # Changed since its metadata was last saved (not persisted itself)
+    _dirty: bool = field(default=True, repr=False, compare=False)
+    # Guards this job's fields against concurrent updates
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
 
     def to_dict(self) -> dict:
         """Convert job to dictionary for JSON serialization."""
-        data = asdict(self)
-        # Convert datetime objects to ISO format strings
-        for key in ['created_at', 'started_at', 'completed_at']:
-            if data[key] is not None:
-                data[key] = data[key].isoformat()
-        # Convert enum to string
-        data['status'] = self.status.value
-        return data
+        # Built field by field: dataclasses.asdict deep-copies every value reflectively
+        return {
+            "job_id": self.job_id,
+            "filename": self.filename,
+            "status": self.status.value,
+            "progress": self.progress,
+            "model_used": self.model_used,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+            "input_path": self.input_path,
+            "output_dir": self.output_dir,
+            "stems": dict(self.stems) if self.stems is not None else None,
+            "error_message": self.error_message,
+            "processing_time": self.processing_time,
+            "content_key": self.content_key,
+        }
 
     @classmethod
     def from_dict(cls, data: dict) -> 'Job':
@@ -62,46 +83,98 @@ class Job:
         return cls(**data)
 
 
+# Finished jobs, which history pruning may evict
+TERMINAL_STATUSES = frozenset({JobStatus.COMPLETED, JobStatus.FAILED})
+
+
 class JobStore:
-    """Thread-safe in-memory job storage."""
+    """
+    Thread-safe in-memory job storage.
+
+    Reads (get, list_jobs, count) take no lock: single dict operations are
+    atomic under the GIL, and the jobs dict is only mutated by setitem/pop.
+    Each job has its own lock for field updates, so status polls and
+    updates for different jobs never contend. The store-wide lock guards
+    structural changes and cross-job state: adding/removing jobs, the
+    content index, the per-status job counts and subscribers. It may be
+    taken before a job's lock, never after.
+    """
 
     _max_history: int = 1000
 
     def __init__(self):
         self._jobs: Dict[str, Job] = {}
         self._lock = threading.Lock()
+        # Number of jobs in each status, kept in step with adds, updates and removals
+        self._status_counts: Dict[JobStatus, int] = {status: 0 for status in JobStatus}
+        # Min-heap of (finish time, job_id) for finished jobs, oldest first, so
+        # pruning pops evictees instead of sorting every job. Entries for jobs
+        # deleted since are skipped when popped.
+        self._evict_heap: List[Tuple[datetime, str]] = []
+        # content_key -> job_id, to find earlier runs of the same input and settings
+        self._content_index: Dict[str, str] = {}
+        # job_id -> queues of subscribers waiting on that job's updates
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        # Metadata database (see open_database); None = per-job metadata.json files
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+    def open_database(self, db_path: Path) -> None:
+        """
+        Persist job metadata in a SQLite database instead of per-job metadata.json files.
+
+        Each save is then one small row write (WAL mode, so readers never block
+        and commits are cheap), and startup reads every job with one query
+        instead of walking the output directory. Call before load_from_disk();
+        if the database is empty, that imports existing metadata.json files.
+
+        Args:
+            db_path: SQLite database file
+        """
+        db = sqlite3.connect(os.fspath(db_path), check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, data BLOB NOT NULL)")
+        db.commit()
+        self._db = db
+        logger.info(f"Job metadata database opened at {db_path}")
+
+    def close(self) -> None:
+        """Close the metadata database, if one is open."""
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
 
     def add(self, job: Job) -> None:
         """Add a new job to the store."""
         with self._lock:
-            self._jobs[job.job_id] = job
-            self._prune_history()
+            self._insert(job)
             logger.info(f"Job {job.job_id} added to store")
 
-    def try_add_with_capacity(self, job: Job, max_concurrent_jobs: int) -> tuple[bool, int]:
+    def add_if_new(self, job: Job) -> Optional[Job]:
         """
-        Atomically check capacity (queued + processing) and add a job if allowed.
+        Atomically add a job unless one with the same content_key already exists.
+
+        Failed jobs don't count as duplicates, so a retry runs again.
 
         Returns:
-            (added, active_count_before_add)
+            The existing job if this is a duplicate, otherwise None (job was added)
         """
         with self._lock:
-            active_count = sum(
-                1 for j in self._jobs.values()
-                if j.status in {JobStatus.QUEUED, JobStatus.PROCESSING}
-            )
-            if active_count >= max_concurrent_jobs:
-                return False, active_count
+            if job.content_key is not None:
+                existing_id = self._content_index.get(job.content_key)
+                existing = self.get(existing_id) if existing_id else None
+                if existing is not None and existing.status != JobStatus.FAILED:
+                    return existing
 
-            self._jobs[job.job_id] = job
-            self._prune_history()
+            self._insert(job)
             logger.info(f"Job {job.job_id} added to store")
-            return True, active_count
+            return None
 
     def get(self, job_id: str) -> Optional[Job]:
-        """Get a job by ID."""
-        with self._lock:
-            return self._jobs.get(job_id)
+        """Get a job by ID (lock-free; a single dict lookup is atomic)."""
+        return self._jobs.get(job_id)
 
     def update(
         self,
@@ -121,42 +194,133 @@ class JobStore:
         Returns:
             Updated job or None if job not found
         """
+        job = self._jobs.get(job_id)
+        if job is None:
+            logger.warning(f"Attempted to update non-existent job {job_id}")
+            return None
+
+        # Status changes also move the per-status counts, so they happen under
+        # the store lock (taken first, per the lock order); other updates only
+        # need the job's own lock
+        store_lock = self._lock if status is not None else contextlib.nullcontext()
+        with store_lock:
+            with job._lock:
+                previous_status = job.status
+
+                if status is not None:
+                    job.status = status
+                if progress is not None:
+                    job.progress = progress
+                if model_used is not None:
+                    job.model_used = model_used
+                if started_at is not None:
+                    job.started_at = started_at
+                if completed_at is not None:
+                    job.completed_at = completed_at
+                if stems is not None:
+                    job.stems = stems
+                if error_message is not None:
+                    job.error_message = error_message
+                if processing_time is not None:
+                    job.processing_time = processing_time
+                job._dirty = True
+
+                snapshot = replace(job)
+
+            # Skip the counts if the job was deleted while we waited for the lock
+            if snapshot.status != previous_status and self._jobs.get(job_id) is job:
+                self._status_counts[previous_status] -= 1
+                self._status_counts[snapshot.status] += 1
+                if snapshot.status in TERMINAL_STATUSES:
+                    self._push_evictable(snapshot)
+
+        logger.info(f"Job {job_id} updated: status={snapshot.status}, progress={snapshot.progress}")
+        if job_id in self._subscribers:
+            with self._lock:
+                self._publish(snapshot)
+        return job
+
+    def set_progress(self, job_id: str, progress: float) -> None:
+        """
+        Update only a job's progress.
+
+        Cheaper than update() for frequent progress ticks: takes just the
+        job's lock and skips logging; nothing is persisted.
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+
+        with job._lock:
+            job.progress = progress
+            job._dirty = True
+            snapshot = replace(job)
+
+        if job_id in self._subscribers:
+            with self._lock:
+                self._publish(snapshot)
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        """
+        Subscribe to updates for a job.
+
+        Must be called from a running event loop. The returned queue starts
+        with a snapshot of the job's current state (if it exists), and every
+        subsequent update() puts another snapshot on it, whichever thread the
+        update happens on.
+
+        Args:
+            job_id: Job ID to watch
+
+        Returns:
+            Queue receiving Job snapshots
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
         with self._lock:
+            self._subscribers.setdefault(job_id, []).append((loop, queue))
+            # Snapshot after registering: an update that skipped publishing
+            # because it saw no subscribers has already been applied to the job,
+            # so its state (terminal or not) is in this snapshot
             job = self._jobs.get(job_id)
-            if job is None:
-                logger.warning(f"Attempted to update non-existent job {job_id}")
-                return None
+            if job is not None:
+                with job._lock:
+                    queue.put_nowait(replace(job))
+        return queue
 
-            if status is not None:
-                job.status = status
-            if progress is not None:
-                job.progress = progress
-            if model_used is not None:
-                job.model_used = model_used
-            if started_at is not None:
-                job.started_at = started_at
-            if completed_at is not None:
-                job.completed_at = completed_at
-            if stems is not None:
-                job.stems = stems
-            if error_message is not None:
-                job.error_message = error_message
-            if processing_time is not None:
-                job.processing_time = processing_time
-
-            self._prune_history()
-            logger.info(f"Job {job_id} updated: status={job.status}, progress={job.progress}")
-            return job
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue) -> None:
+        """Stop delivering updates for a job to the given queue."""
+        with self._lock:
+            subscribers = self._subscribers.get(job_id)
+            if not subscribers:
+                return
+            subscribers[:] = [(loop, q) for loop, q in subscribers if q is not queue]
+            if not subscribers:
+                del self._subscribers[job_id]
+
+    def _publish(self, snapshot: Job) -> None:
+        """Hand a job snapshot to its subscribers (caller holds the store lock)."""
+        subscribers = self._subscribers.get(snapshot.job_id)
+        if not subscribers:
+            return
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, snapshot)
+            except RuntimeError:
+                # Subscriber's loop already closed
+                pass
 
     def save_metadata(self, job_id: str) -> bool:
         """
-        Save job metadata to JSON file.
+        Save job metadata to the database, or to metadata.json in its output directory.
+
+        Does nothing if the job hasn't changed since it was last saved.
 
         Args:
             job_id: Job ID to save
 
         Returns:
-            True if successful, False otherwise
+            True if successful (or already up to date), False otherwise
         """
         job = self.get(job_id)
         if job is None:
@@ -167,18 +331,30 @@ class JobStore:
             logger.error(f"Cannot save metadata for job {job_id}: no output_dir set")
             return False
 
+        with job._lock:
+            if not job._dirty:
+                return True
+            data = job.to_dict()
+            job._dirty = False
+
         try:
+            if self._db is not None:
+                self._write_rows([(job_id, data)])
+                logger.info(f"Metadata saved for job {job_id}")
+                return True
+
             output_path = Path(job.output_dir)
             output_path.mkdir(parents=True, exist_ok=True)
 
             metadata_file = output_path / "metadata.json"
-            with open(metadata_file, 'w') as f:
-                json.dump(job.to_dict(), f, indent=2)
+            with open(metadata_file, 'wb') as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
 
             logger.info(f"Metadata saved for job {job_id} to {metadata_file}")
             return True
 
         except Exception as e:
+            job._dirty = True
             logger.error(f"Error saving metadata for job {job_id}: {e}")
             return False
 
@@ -199,8 +375,8 @@ class JobStore:
                 logger.warning(f"Metadata file not found: {metadata_file}")
                 return None
 
-            with open(metadata_file, 'r') as f:
-                data = json.load(f)
+            with open(metadata_file, 'rb') as f:
+                data = orjson.loads(f.read())
 
             file_job_id = data.get("job_id")
             if file_job_id is not None and file_job_id != job_id:
@@ -211,6 +387,8 @@ class JobStore:
                 return None
 
             job = Job.from_dict(data)
+            # Just read from disk, so there's nothing to write back
+            job._dirty = False
             self.add(job)
             logger.info(f"Metadata loaded for job {file_job_id or job_id} from {metadata_file}")
             return job
@@ -221,7 +399,8 @@ class JobStore:
 
     def load_from_disk(self, root_output_dir: Path) -> int:
         """
-        Scan the output directory for existing jobs and load them into memory.
+        Load existing jobs into memory, from the database if one is open,
+        otherwise by scanning the output directory.
 
         Args:
             root_output_dir: Root output directory containing job subdirectories
@@ -229,33 +408,87 @@ class JobStore:
         Returns:
             Number of jobs loaded
         """
+        if self._db is not None:
+            loaded_count = self._load_from_database()
+            if loaded_count is not None:
+                return loaded_count
+
         if not root_output_dir.exists():
             logger.warning(f"Output directory {root_output_dir} does not exist")
             return 0
 
-        loaded_count = 0
         logger.info(f"Scanning {root_output_dir} for existing jobs...")
 
-        for job_dir in root_output_dir.iterdir():
-            if not job_dir.is_dir():
-                continue
-            
-            # Simple check via directory name (uuid)
-            job_id = job_dir.name
+        # Job directories are named by UUID (length check is enough for a directory scan).
+        # scandir's entries carry the file type, so is_dir() needs no extra stat.
+        with os.scandir(root_output_dir) as it:
+            entries = [e for e in it if len(e.name) == 36 and e.is_dir()]
+
+        def load(entry: os.DirEntry) -> bool:
             try:
-                # Basic UUID validation (length check is usually enough for directory scan)
-                if len(job_id) != 36: 
-                    continue
-                
-                job = self.load_metadata(job_id, str(job_dir))
-                if job:
-                    loaded_count += 1
+                return self.load_metadata(entry.name, entry.path) is not None
             except Exception as e:
-                logger.warning(f"Failed to load job from {job_dir}: {e}")
+                logger.warning(f"Failed to load job from {entry.path}: {e}")
+                return False
+
+        # Reads are I/O-bound (cold cache, network filesystems), so overlap them
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            loaded_count = sum(executor.map(load, entries))
+
+        if self._db is not None and loaded_count:
+            # First start with a database: carry the metadata.json jobs over
+            self._write_rows([(job.job_id, job.to_dict()) for job in self.list_jobs()])
+            logger.info(f"Imported {loaded_count} jobs into the metadata database")
 
         logger.info(f"Loaded {loaded_count} jobs from disk")
         return loaded_count
 
+    def _load_from_database(self) -> Optional[int]:
+        """
+        Load every job stored in the database.
+
+        Jobs whose output directory has been deleted are dropped.
+
+        Returns:
+            Number of jobs loaded, or None if the database is empty
+        """
+        with self._db_lock:
+            rows = self._db.execute("SELECT job_id, data FROM jobs").fetchall()
+        if not rows:
+            return None
+
+        loaded_count = 0
+        missing: List[Tuple[str]] = []
+        for job_id, data in rows:
+            try:
+                job = Job.from_dict(orjson.loads(data))
+            except Exception as e:
+                logger.warning(f"Failed to load job {job_id} from database: {e}")
+                continue
+            if job.output_dir is not None and not os.path.isdir(job.output_dir):
+                missing.append((job_id,))
+                continue
+            job._dirty = False
+            self.add(job)
+            loaded_count += 1
+
+        if missing:
+            with self._db_lock, self._db:
+                self._db.executemany("DELETE FROM jobs WHERE job_id = ?", missing)
+            logger.info(f"Dropped {len(missing)} jobs whose outputs no longer exist")
+
+        logger.info(f"Loaded {loaded_count} jobs from database")
+        return loaded_count
+
+    def _write_rows(self, rows: List[Tuple[str, dict]]) -> None:
+        """Insert or replace job metadata rows in one transaction."""
+        with self._db_lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO jobs (job_id, data) VALUES (?, ?)",
+                [(job_id, orjson.dumps(data)) for job_id, data in rows]
+            )
+
     def list_jobs(self, status: Optional[JobStatus] = None) -> list[Job]:
         """
         List all jobs, optionally filtered by status.
@@ -266,11 +499,11 @@ class JobStore:
         Returns:
             List of jobs
         """
-        with self._lock:
-            jobs = list(self._jobs.values())
-            if status is not None:
-                jobs = [j for j in jobs if j.status == status]
-            return jobs
+        # Snapshot of the values; list() over a dict view doesn't release the GIL
+        jobs = list(self._jobs.values())
+        if status is not None:
+            jobs = [j for j in jobs if j.status == status]
+        return jobs
 
     def delete(self, job_id: str) -> bool:
         """
@@ -283,8 +516,7 @@ class JobStore:
             True if deleted, False if not found
         """
         with self._lock:
-            if job_id in self._jobs:
-                del self._jobs[job_id]
+            if self._remove(job_id):
                 logger.info(f"Job {job_id} deleted from store")
                 return True
             return False
@@ -299,28 +531,46 @@ class JobStore:
         Returns:
             Number of jobs
         """
-        with self._lock:
-            if status is None:
-                return len(self._jobs)
-            return sum(1 for j in self._jobs.values() if j.status == status)
+        if status is None:
+            return sum(self._status_counts.values())
+        return self._status_counts[status]
 
     def _prune_history(self) -> None:
-        """Evict old completed/failed jobs to cap memory usage."""
-        if len(self._jobs) <= self._max_history:
-            return
-
-        removable = [
-            job for job in self._jobs.values()
-            if job.status in {JobStatus.COMPLETED, JobStatus.FAILED}
-        ]
-        if not removable:
-            return
-
-        removable.sort(key=lambda job: job.completed_at or job.created_at or datetime.min)
-        to_remove = len(self._jobs) - self._max_history
-
-        for job in removable[:to_remove]:
-            self._jobs.pop(job.job_id, None)
+        """Evict the oldest completed/failed jobs to cap memory usage (caller holds the store lock)."""
+        while self.count() > self._max_history and self._evict_heap:
+            _, job_id = heapq.heappop(self._evict_heap)
+            job = self._jobs.get(job_id)
+            if job is not None and job.status in TERMINAL_STATUSES:
+                self._remove(job_id)
+
+    def _push_evictable(self, job: Job) -> None:
+        """Queue a finished job for eventual pruning (caller holds the store lock)."""
+        finished_at = job.completed_at or job.created_at or datetime.min
+        heapq.heappush(self._evict_heap, (finished_at, job.job_id))
+
+    def _insert(self, job: Job) -> None:
+        """Store a job and index it (caller holds the store lock)."""
+        previous = self._jobs.get(job.job_id)
+        self._jobs[job.job_id] = job
+        if previous is not None:
+            self._status_counts[previous.status] -= 1
+        self._status_counts[job.status] += 1
+        if job.status in TERMINAL_STATUSES:
+            self._push_evictable(job)
+        if job.content_key is not None:
+            self._content_index[job.content_key] = job.job_id
+        self._prune_history()
+
+    def _remove(self, job_id: str) -> bool:
+        """Drop a job and its index entry (caller holds the store lock)."""
+        job = self._jobs.pop(job_id, None)
+        if job is None:
+            return False
+        self._status_counts[job.status] -= 1
+        if job.content_key is not None:
+            if self._content_index.get(job.content_key) == job_id:
+                del self._content_index[job.content_key]
+        return True
 
 
 # Global job store instance
@@ -0,0 +1,117 @@
+"""
+Coalescing batcher for lrclib synced-lyrics lookups.
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+import httpx
+from fastapi import Request
+
+from app.services.http_client import get_with_retry
+
+logger = logging.getLogger(__name__)
+
+LRCLIB_SEARCH_URL = "https://lrclib.net/api/search"
+
+
+class LrclibBatcher:
+    """
+    Collects lrclib searches that arrive within a short window and dispatches
+    them together.
+
+    Identical queries in the same window share one upstream request, and the
+    number of in-flight requests to lrclib is capped by a semaphore so bursts
+    of lyric lookups don't trip its rate limiting.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        window: float = 0.025,
+        max_concurrency: int = 8
+    ):
+        """
+        Args:
+            client: Shared HTTP client used for the lrclib requests
+            window: Seconds to wait for more lookups after the first one arrives
+            max_concurrency: Maximum concurrent requests to lrclib
+        """
+        self._client = client
+        self._window = window
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._queue: asyncio.Queue[Tuple[str, asyncio.Future]] = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        """Start the background task that drains the lookup queue."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop draining and cancel any lookups still in progress."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for task in list(self._inflight):
+            task.cancel()
+        await asyncio.gather(*self._inflight, return_exceptions=True)
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
+
+    async def search(self, query: str) -> Optional[str]:
+        """
+        Look up synced lyrics for a free-text query.
+
+        Returns:
+            The LRC text of the best match, or None if lrclib has none
+
+        Raises:
+            httpx.HTTPError: If the upstream request failed
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((query, future))
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            await asyncio.sleep(self._window)
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            waiters: Dict[str, List[asyncio.Future]] = {}
+            for query, future in batch:
+                waiters.setdefault(query, []).append(future)
+            logger.debug(f"Dispatching {len(waiters)} lrclib lookup(s) for {len(batch)} request(s)")
+
+            for query, futures in waiters.items():
+                task = asyncio.create_task(self._resolve(query, futures))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+
+    async def _resolve(self, query: str, futures: List[asyncio.Future]) -> None:
+        try:
+            async with self._semaphore:
+                resp = await get_with_retry(self._client, LRCLIB_SEARCH_URL, params={"q": query})
+            resp.raise_for_status()
+            data = resp.json()
+            result = data[0].get("syncedLyrics") if data else None
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future in futures:
+            if not future.done():
+                future.set_result(result)
+
+
+def get_lrclib_batcher(request: Request) -> LrclibBatcher:
+    """FastAPI dependency returning the batcher started in the app lifespan."""
+    return request.app.state.lrclib
@@ -0,0 +1,73 @@
+"""
+Per-client fixed-window rate limiting for routes that spend upstream quota.
+"""
+import math
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+from fastapi import HTTPException, Request
+
+
+class FixedWindowRateLimiter:
+    """
+    Allows at most `limit` requests per client in each `window`-second window.
+
+    Genius enforces a single quota per API token, so without a server-side
+    limit one noisy client can starve lookups for everyone else.
+    """
+
+    def __init__(self, limit: int, window: float = 60.0):
+        self.limit = limit
+        self.window = window
+        self._counters: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str) -> float:
+        """
+        Record a request for `key`.
+
+        Args:
+            key: Client identifier (remote address)
+
+        Returns:
+            0 if the request is allowed, otherwise seconds until the window resets
+        """
+        now = time.monotonic()
+        with self._lock:
+            window_start, count = self._counters.get(key, (now, 0))
+            if now - window_start >= self.window:
+                window_start, count = now, 0
+            if count >= self.limit:
+                return window_start + self.window - now
+            self._counters[key] = (window_start, count + 1)
+            if len(self._counters) > 10_000:
+                self._evict_expired(now)
+            return 0.0
+
+    def _evict_expired(self, now: float) -> None:
+        """Drop counters whose window has already closed."""
+        expired = [k for k, (start, _) in self._counters.items() if now - start >= self.window]
+        for key in expired:
+            del self._counters[key]
+
+
+def rate_limit(limit: int, window: float = 60.0) -> Callable[[Request], None]:
+    """
+    Build a route dependency that enforces `limit` requests per `window` seconds per client IP.
+
+    Rejected requests get a 429 with a Retry-After header so clients can back off.
+    """
+    limiter = FixedWindowRateLimiter(limit, window)
+
+    def dependency(request: Request) -> None:
+        client_ip = request.client.host if request.client else "unknown"
+        retry_after = limiter.hit(client_ip)
+        if retry_after > 0:
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded. Please try again later.",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+    return dependency
@@ -0,0 +1,222 @@
+"""
+Separation worker that runs Demucs jobs outside the request/response cycle.
+"""
+from datetime import datetime
+from typing import List, Optional
+import asyncio
+import logging
+import os
+import time
+
+from app.config import settings
+from app.services.demucs_service import (
+    get_demucs_service,
+    get_executor,
+    separate_audio_in_process,
+    uses_worker_processes
+)
+from app.services.inference_batcher import InferenceBatcher
+from app.services.janitor import remove_later
+from app.services.job_store import get_job_store, JobStatus
+
+logger = logging.getLogger(__name__)
+
+# Pending jobs and the long-lived tasks draining them (set up by start())
+_queue: Optional[asyncio.Queue] = None
+_workers: List[asyncio.Task] = []
+# Groups concurrent jobs into batched forward passes
+_batcher: Optional[InferenceBatcher] = None
+
+
+def start(num_workers: int, max_pending: int) -> None:
+    """
+    Create the job queue and spawn its worker tasks.
+
+    Must be called from the event loop (e.g. app lifespan startup).
+
+    Args:
+        num_workers: Number of jobs processed concurrently
+        max_pending: Maximum jobs waiting in the queue before submissions are refused
+    """
+    global _queue, _batcher
+    _queue = asyncio.Queue(maxsize=max_pending)
+    _batcher = InferenceBatcher(max_batch=num_workers)
+    _batcher.start()
+    for i in range(num_workers):
+        _workers.append(asyncio.create_task(_worker(_queue), name=f"separation-worker-{i}"))
+    logger.info(f"Started {num_workers} separation worker(s), queue size {max_pending}")
+
+
+async def _worker(queue: asyncio.Queue) -> None:
+    """Process queued jobs one at a time until cancelled."""
+    while True:
+        job_args = await queue.get()
+        try:
+            await process_separation_job(**job_args)
+        except Exception as e:
+            # process_separation_job records its own failures; this is a last resort
+            logger.error(f"Unhandled error in separation worker: {e}", exc_info=True)
+        finally:
+            queue.task_done()
+
+
+def submit_job(
+    job_id: str,
+    model: str,
+    device: str,
+    segment: Optional[int],
+    shifts: int,
+    precision: str = "fp32",
+    batch_size: int = 1
+) -> None:
+    """
+    Queue a separation job and return immediately.
+
+    Raises:
+        asyncio.QueueFull: If the queue is at capacity
+        RuntimeError: If start() hasn't been called
+    """
+    if _queue is None:
+        raise RuntimeError("Separation worker not started")
+    _queue.put_nowait({
+        "job_id": job_id,
+        "model": model,
+        "device": device,
+        "segment": segment,
+        "shifts": shifts,
+        "precision": precision,
+        "batch_size": batch_size,
+    })
+
+
+async def shutdown() -> None:
+    """Stop the workers, cancelling any jobs still awaiting separation results."""
+    global _queue, _batcher
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _queue = None
+    if _batcher is not None:
+        await _batcher.stop()
+        _batcher = None
+
+
+async def process_separation_job(
+    job_id: str,
+    model: str,
+    device: str,
+    segment: Optional[int],
+    shifts: int,
+    precision: str = "fp32",
+    batch_size: int = 1
+):
+    """
+    Background task to process audio separation.
+
+    Args:
+        job_id: Job ID
+        model: Demucs model name
+        device: "cuda" or "cpu"
+        segment: Segment size for memory constraints
+        shifts: Quality parameter (1-5)
+        precision: Inference precision on GPU ("bf16", "fp16" or "fp32")
+        batch_size: Demucs segments per forward pass on GPU
+    """
+    job_store = get_job_store()
+    start_time = time.monotonic()
+
+    try:
+        # Update job status to processing (a worker has taken it off the queue)
+        job = job_store.update(
+            job_id,
+            status=JobStatus.PROCESSING,
+            started_at=datetime.now(),
+            progress=0.1
+        )
+        if job is None:
+            logger.error(f"Job {job_id} not found")
+            return
+
+        output_dir = os.fspath(settings.output_dir)
+        if uses_worker_processes(device):
+            # CPU and multi-GPU jobs run in worker processes, which load their own models
+            job_store.set_progress(job_id, 0.2)
+            logger.info(f"Starting separation for job {job_id}")
+            stems = await separate_audio_in_process(
+                model,
+                device,
+                segment,
+                settings.demucs_overlap,
+                input_path=job.input_path,
+                output_dir=output_dir,
+                job_id=job_id,
+                shifts=shifts,
+                precision=precision,
+                batch_size=batch_size
+            )
+        else:
+            # Get the shared Demucs service off the event loop (first load can be expensive)
+            logger.info(f"Initializing Demucs for job {job_id}")
+            loop = asyncio.get_running_loop()
+            demucs_service = await loop.run_in_executor(
+                get_executor(),
+                get_demucs_service,
+                model,
+                device,
+                segment,
+                settings.demucs_overlap,
+                precision,
+                batch_size
+            )
+
+            # Update progress
+            job_store.set_progress(job_id, 0.2)
+
+            # Run separation
+            logger.info(f"Starting separation for job {job_id}")
+            if _batcher is not None:
+                stems = await _batcher.separate(
+                    demucs_service,
+                    input_path=job.input_path,
+                    output_dir=output_dir,
+                    job_id=job_id,
+                    shifts=shifts
+                )
+            else:
+                stems = await demucs_service.separate_audio(
+                    input_path=job.input_path,
+                    output_dir=output_dir,
+                    job_id=job_id,
+                    shifts=shifts
+                )
+
+        # Calculate processing time
+        processing_time = time.monotonic() - start_time
+
+        # Update job with results
+        job_store.update(
+            job_id,
+            status=JobStatus.COMPLETED,
+            completed_at=datetime.now(),
+            stems=stems,
+            progress=1.0,
+            processing_time=processing_time
+        )
+
+        # Save metadata
+        job_store.save_metadata(job_id)
+        remove_later(settings.upload_dir / job_id)
+
+        logger.info(f"Job {job_id} completed successfully in {processing_time:.2f}s")
+
+    except Exception as e:
+        logger.error(f"Error processing job {job_id}: {e}", exc_info=True)
+        job_store.update(
+            job_id,
+            status=JobStatus.FAILED,
+            error_message=str(e),
+            completed_at=datetime.now()
+        )
+        job_store.save_metadata(job_id)
+        remove_later(settings.upload_dir / job_id)
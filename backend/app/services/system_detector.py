@@ -6,7 +6,7 @@ import psutil
 from dataclasses import dataclass
 from typing import Optional
 import logging
-import threading
+from functools import lru_cache
 
 try:
     import torch
@@ -16,9 +16,9 @@ except Exception:
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+@dataclass(frozen=True)
 class SystemCapabilities:
-    """System capabilities information."""
+    """System capabilities information (detected once and shared, so read-only)."""
     has_gpu: bool
     gpu_name: Optional[str]
     gpu_memory_gb: Optional[float]
@@ -28,6 +28,8 @@ class SystemCapabilities:
     recommended_segment: Optional[int]
     max_concurrent_jobs: int
     device: str  # "cuda" or "cpu"
+    precision: str = "fp32"  # Inference precision: "bf16", "fp16" or "fp32"
+    recommended_batch_size: int = 1  # Demucs segments per forward pass
 
 
 class SystemDetector:
@@ -45,10 +47,13 @@ class SystemDetector:
             SystemCapabilities object with detected info and recommendations
         """
         # Detect GPU
-        if torch is None:
-            has_gpu = False
-        else:
-            has_gpu = torch.cuda.is_available() and not force_cpu
+        has_gpu = False
+        if torch is not None and not force_cpu:
+            try:
+                has_gpu = torch.cuda.is_available()
+            except Exception as e:
+                # Broken or missing CUDA drivers shouldn't stop the server from starting
+                logger.warning(f"CUDA unavailable, using CPU: {e}")
         gpu_name = None
         gpu_memory_gb = None
         device = "cpu"
@@ -85,6 +90,9 @@ class SystemDetector:
             has_gpu = False
             device = "cpu"
 
+        precision = SystemDetector._recommend_precision(has_gpu)
+        recommended_batch_size = SystemDetector._recommend_batch_size(has_gpu, gpu_memory_gb)
+
         # Recommend max concurrent jobs based on resources
         max_concurrent_jobs = SystemDetector._recommend_max_jobs(
             has_gpu, gpu_memory_gb
@@ -92,7 +100,8 @@ class SystemDetector:
 
         logger.info(
             f"System detected - GPU: {has_gpu}, Model: {recommended_model}, "
-            f"Segment: {recommended_segment}, Max Jobs: {max_concurrent_jobs}"
+            f"Segment: {recommended_segment}, Max Jobs: {max_concurrent_jobs}, "
+            f"Precision: {precision}, Batch: {recommended_batch_size}"
         )
 
         return SystemCapabilities(
@@ -104,7 +113,9 @@ class SystemDetector:
             recommended_model=recommended_model,
             recommended_segment=recommended_segment,
             max_concurrent_jobs=max_concurrent_jobs,
-            device=device
+            device=device,
+            precision=precision,
+            recommended_batch_size=recommended_batch_size
         )
 
     @staticmethod
@@ -145,6 +156,52 @@ class SystemDetector:
             logger.info(f"Very limited GPU ({gpu_memory_gb:.1f}GB): Using htdemucs")
             return "htdemucs", None
 
+    @staticmethod
+    def _recommend_precision(has_gpu: bool) -> str:
+        """
+        Recommend inference precision for the detected device.
+
+        Tensor cores run half precision much faster than fp32: bf16 on Ampere
+        and newer, fp16 on Volta/Turing. Older GPUs (e.g. Pascal) and CPUs
+        gain nothing from it, so they stay in fp32.
+
+        Returns:
+            "bf16", "fp16" or "fp32"
+        """
+        if not has_gpu or torch is None:
+            return "fp32"
+
+        try:
+            major, _ = torch.cuda.get_device_capability(0)
+        except Exception as e:
+            logger.warning(f"Could not read GPU compute capability: {e}")
+            return "fp32"
+
+        if major >= 8 and torch.cuda.is_bf16_supported():
+            return "bf16"
+        if major >= 7:
+            return "fp16"
+        return "fp32"
+
+    @staticmethod
+    def _recommend_batch_size(
+        has_gpu: bool,
+        gpu_memory_gb: Optional[float]
+    ) -> int:
+        """
+        Recommend how many Demucs segments to stack per forward pass.
+
+        Batching only pays off on a GPU, where a single segment leaves most
+        of the cores idle; on CPU the threads are already saturated.
+        """
+        if not has_gpu or gpu_memory_gb is None:
+            return 1
+        if gpu_memory_gb >= 8.0:
+            return 4
+        if gpu_memory_gb >= 4.0:
+            return 2
+        return 1
+
     @staticmethod
     def _recommend_max_jobs(
         has_gpu: bool,
@@ -203,15 +260,19 @@ class SystemDetector:
         return True, None
 
 
-# Global instance for easy access
-_system_capabilities: Optional[SystemCapabilities] = None
-_system_capabilities_lock = threading.Lock()
+@lru_cache(maxsize=2)
+def _cached_capabilities(force_cpu: bool) -> SystemCapabilities:
+    """Detect capabilities once per force_cpu value for the life of the process."""
+    return SystemDetector.detect_capabilities(force_cpu)
 
 
 def get_system_capabilities(force_refresh: bool = False, force_cpu: bool = False) -> SystemCapabilities:
     """
     Get cached system capabilities or detect if not yet cached.
 
+    Hardware doesn't change while the server runs, so detection (CUDA
+    queries, psutil scans) happens once per force_cpu value.
+
     Args:
         force_refresh: Force re-detection even if cached
         force_cpu: Force CPU usage even if GPU is available
@@ -219,36 +280,6 @@ def get_system_capabilities(force_refresh: bool = False, force_cpu: bool = False
     Returns:
         SystemCapabilities object
     """
-    global _system_capabilities
-
-    # Re-detect if cache is empty, refresh requested, or force_cpu conflicts with cache
-    should_refresh = (
-        _system_capabilities is None or
-        force_refresh or
-        (force_cpu and _system_capabilities is not None and _system_capabilities.device != "cpu") or
-        (
-            not force_cpu
-            and _system_capabilities is not None
-            and _system_capabilities.device == "cpu"
-            and torch is not None
-            and torch.cuda.is_available()
-        )
-    )
-
-    if should_refresh:
-        with _system_capabilities_lock:
-            if (
-                _system_capabilities is None or
-                force_refresh or
-                (force_cpu and _system_capabilities is not None and _system_capabilities.device != "cpu") or
-                (
-                    not force_cpu
-                    and _system_capabilities is not None
-                    and _system_capabilities.device == "cpu"
-                    and torch is not None
-                    and torch.cuda.is_available()
-                )
-            ):
-                _system_capabilities = SystemDetector.detect_capabilities(force_cpu)
-
-    return _system_capabilities
+    if force_refresh:
+        _cached_capabilities.cache_clear()
+    return _cached_capabilities(force_cpu)
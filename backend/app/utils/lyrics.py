@@ -1,91 +1,188 @@
-import re
+from dataclasses import dataclass
 from difflib import SequenceMatcher
-from typing import Any, Dict, List, Optional
-
-
-def parse_lrc(lrc: str) -> List[Dict[str, Any]]:
-    lines: List[Dict[str, Any]] = []
-    timestamp_pattern = re.compile(r"\[(\d+):(\d+(?:\.\d+)?)\]")
+from functools import lru_cache
+from itertools import chain, pairwise
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import ahocorasick
+import lxml.html
+
+try:
+    from rapidfuzz import fuzz
+except Exception:
+    fuzz = None
+
+
+@dataclass(slots=True)
+class TimedLine:
+    """One lyric line with its timing (None without synced lyrics) and matched annotations."""
+    line: str
+    start_time: Optional[float]
+    end_time: Optional[float]
+    annotations: List[str]
+    annotation: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to the API's JSON shape."""
+        return {
+            "line": self.line,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "annotations": self.annotations,
+            "annotation": self.annotation,
+        }
+
+
+def _parse_timestamp(tag: str) -> Optional[float]:
+    """Seconds for an `mm:ss` / `mm:ss.xx` tag, or None for anything else (e.g. `ar:Artist`)."""
+    minutes, sep, seconds = tag.partition(":")
+    if not sep or not (minutes.isascii() and minutes.isdigit()):
+        return None
+    whole, dot, fraction = seconds.partition(".")
+    if not (whole.isascii() and whole.isdigit()):
+        return None
+    if dot and not (fraction.isascii() and fraction.isdigit()):
+        return None
+    return int(minutes) * 60 + float(seconds)
+
+
+def parse_lrc(lrc: str) -> Iterator[Tuple[float, str]]:
+    """Yield (start_time, text) for each timestamp, in file order."""
     for raw in lrc.splitlines():
-        matches = list(timestamp_pattern.finditer(raw))
-        if not matches:
+        # Find the [mm:ss.xx] tags with str.find rather than a regex. Other
+        # tags ([ar:...], [offset:...]) are skipped, and the text is whatever
+        # follows the last timestamp.
+        start_times: List[float] = []
+        text_start = 0
+        open_pos = raw.find("[")
+        while open_pos >= 0:
+            close_pos = raw.find("]", open_pos + 1)
+            if close_pos < 0:
+                break
+            start_time = _parse_timestamp(raw[open_pos + 1:close_pos])
+            if start_time is None:
+                open_pos = raw.find("[", open_pos + 1)
+                continue
+            start_times.append(start_time)
+            text_start = close_pos + 1
+            open_pos = raw.find("[", text_start)
+        if not start_times:
             continue
-        text = raw[matches[-1].end():].strip()
-        for match in matches:
-            minutes = int(match.group(1))
-            seconds = float(match.group(2))
-            lines.append(
-                {
-                    "start_time": minutes * 60 + seconds,
-                    "line": text,
-                }
-            )
-    return lines
-
-
-def similarity(a: str, b: str) -> float:
-    return SequenceMatcher(None, a, b).ratio()
+        text = raw[text_start:].strip()
+        for start_time in start_times:
+            yield start_time, text
+
+
+# Minimum similarity for a fragment to count as annotating a line
+MATCH_THRESHOLD = 0.6
+
+
+@lru_cache(maxsize=4096)
+def similarity(a: str, b: str, threshold: float = 0.0) -> float:
+    """
+    Similarity of two strings in [0, 1], or 0.0 if it can't reach `threshold`.
+
+    Uses RapidFuzz's ratio when installed and difflib's Ratcliff/Obershelp
+    ratio otherwise. Both are expensive next to the length bound, which is
+    checked first so most non-matching pairs never get that far. Results are
+    cached, so repeat requests for the same song skip the comparisons.
+    """
+    if a == b:
+        return 1.0
+    len_a, len_b = len(a), len(b)
+    if not len_a or not len_b:
+        return 0.0
+    # Same bound as real_quick_ratio(), checked before building a matcher:
+    # strings of very different lengths can't be similar enough
+    if 2 * min(len_a, len_b) < threshold * (len_a + len_b):
+        return 0.0
+    if fuzz is not None:
+        # Same 2*M/T form, with M the longest common subsequence, in C++
+        return fuzz.ratio(a, b, score_cutoff=threshold * 100) / 100
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    if matcher.quick_ratio() < threshold:
+        return 0.0
+    return matcher.ratio()
 
 
 def flatten_dom(node: Any) -> str:
-    if node is None:
-        return ""
-    if isinstance(node, str):
-        return node
+    # Iterative DFS: no recursion limit on deep DOMs, and a single join at the end
     text_parts: List[str] = []
-    for child in node.get("children", []):
-        text_parts.append(flatten_dom(child))
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current is None:
+            continue
+        if isinstance(current, str):
+            text_parts.append(current)
+            continue
+        children = current.get("children")
+        if children:
+            stack.extend(reversed(children))
     return "".join(text_parts)
 
 
+def extract_lyrics_from_html(html: bytes) -> Optional[str]:
+    doc = lxml.html.fromstring(html)
+    containers = doc.xpath('//div[@data-lyrics-container="true"]')
+    if not containers:
+        return None
+
+    parts: List[str] = []
+    for container in containers:
+        # Contributor/translation headers are injected inside the containers
+        for excluded in container.xpath('.//*[@data-exclude-from-selection="true"]'):
+            excluded.drop_tree()
+        for br in container.iter("br"):
+            br.tail = "\n" + (br.tail or "")
+        parts.append(container.text_content())
+
+    lyrics = "\n".join(parts).strip("\n")
+    return lyrics or None
+
+
 def normalize(text: str) -> str:
-    return re.sub(r"\s+", " ", text).strip().lower()
+    # split() collapses whitespace runs and trims the ends in one C-level pass;
+    # casefold() also folds characters lower() leaves alone (e.g. "ß" -> "ss")
+    return " ".join(text.split()).casefold()
 
 
 def build_timed_annotations(
     lrc_text: Optional[str],
     lyrics_text: Optional[str],
     fragment_annotations: List[Dict[str, str]],
-) -> List[Dict[str, Any]]:
-    timed_annotated_lyrics: List[Dict[str, Any]] = []
+) -> List[TimedLine]:
+    timed_annotated_lyrics: List[TimedLine] = []
+
+    # Normalize fragments once, not once per line
+    norm_fragments = [
+        (normalize(item["fragment"]), item.get("annotation", ""))
+        for item in fragment_annotations
+        if item.get("fragment")
+    ]
+    fragment_automaton = _build_automaton(norm_fragments)
+    # Repeated lines (choruses) are matched once
+    line_matches: Dict[str, List[str]] = {}
+
+    def annotations_for(text: str) -> List[str]:
+        if not norm_fragments:
+            # Nothing to match (the common case): skip normalizing the line
+            return []
+        norm_line = normalize(text)
+        deduped = line_matches.get(norm_line)
+        if deduped is None:
+            deduped = _match_fragments(norm_line, norm_fragments, fragment_automaton)
+            line_matches[norm_line] = deduped
+        return deduped
 
     if lrc_text and lrc_text.strip():
-        lrc_lines = parse_lrc(lrc_text)
-        for i, lrc_line in enumerate(lrc_lines):
-            text = lrc_line["line"]
-            norm_line = normalize(text)
-            matched_annotations: List[str] = []
-
-            for item in fragment_annotations:
-                fragment = item.get("fragment", "")
-                annotation = item.get("annotation", "")
-                if not fragment:
-                    continue
-                if fragment in norm_line:
-                    matched_annotations.append(annotation)
-                    continue
-                if similarity(fragment, norm_line) >= 0.6:
-                    matched_annotations.append(annotation)
-
-            # De-duplicate while preserving order
-            seen = set()
-            deduped = []
-            for ann in matched_annotations:
-                if ann in seen:
-                    continue
-                seen.add(ann)
-                deduped.append(ann)
+        # Each line ends where the next starts; the last one gets 3 seconds
+        for (start_time, text), following in pairwise(chain(parse_lrc(lrc_text), [None])):
+            end_time = following[0] if following is not None else start_time + 3
+            deduped = annotations_for(text)
 
             timed_annotated_lyrics.append(
-                {
-                    "line": text,
-                    "start_time": lrc_line["start_time"],
-                    "end_time": lrc_lines[i + 1]["start_time"]
-                    if i + 1 < len(lrc_lines)
-                    else lrc_line["start_time"] + 3,
-                    "annotations": deduped,
-                    "annotation": "\n\n".join(deduped),
-                }
+                TimedLine(text, start_time, end_time, deduped, "\n\n".join(deduped))
             )
 
         return timed_annotated_lyrics
@@ -93,32 +190,47 @@ def build_timed_annotations(
     if lyrics_text:
         lyrics_lines = [line.strip() for line in lyrics_text.splitlines() if line.strip()]
         for text in lyrics_lines:
-            norm_line = normalize(text)
-            matched_annotations: List[str] = []
-            for item in fragment_annotations:
-                fragment = item.get("fragment", "")
-                annotation = item.get("annotation", "")
-                if not fragment:
-                    continue
-                if fragment in norm_line or similarity(fragment, norm_line) >= 0.6:
-                    matched_annotations.append(annotation)
-
-            seen = set()
-            deduped = []
-            for ann in matched_annotations:
-                if ann in seen:
-                    continue
-                seen.add(ann)
-                deduped.append(ann)
+            deduped = annotations_for(text)
 
             timed_annotated_lyrics.append(
-                {
-                    "line": text,
-                    "start_time": None,
-                    "end_time": None,
-                    "annotations": deduped,
-                    "annotation": "\n\n".join(deduped),
-                }
+                TimedLine(text, None, None, deduped, "\n\n".join(deduped))
             )
 
     return timed_annotated_lyrics
+
+
+def _build_automaton(norm_fragments: List[Tuple[str, str]]) -> Optional[ahocorasick.Automaton]:
+    """Aho-Corasick automaton over the fragments, mapping each to its indices in norm_fragments."""
+    if not norm_fragments:
+        return None
+    automaton = ahocorasick.Automaton()
+    for index, (fragment, _) in enumerate(norm_fragments):
+        if fragment in automaton:
+            automaton.get(fragment).append(index)
+        else:
+            automaton.add_word(fragment, [index])
+    automaton.make_automaton()
+    return automaton
+
+
+def _match_fragments(
+    norm_line: str,
+    norm_fragments: List[Tuple[str, str]],
+    automaton: Optional[ahocorasick.Automaton],
+) -> List[str]:
+    """Annotations whose fragment appears in or closely matches the line, deduplicated in order."""
+    # One pass over the line finds every fragment that occurs in it verbatim;
+    # only the rest need the fuzzy comparison
+    contained = set()
+    if automaton is not None:
+        for _, indices in automaton.iter(norm_line):
+            contained.update(indices)
+
+    # Insertion-ordered, so it doubles as the order-preserving dedup
+    matched_annotations: Dict[str, None] = {}
+    for index, (fragment, annotation) in enumerate(norm_fragments):
+        if annotation in matched_annotations:
+            continue
+        if index in contained or similarity(fragment, norm_line, MATCH_THRESHOLD) >= MATCH_THRESHOLD:
+            matched_annotations[annotation] = None
+    return list(matched_annotations)
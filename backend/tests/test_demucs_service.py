@@ -0,0 +1,60 @@
+"""Tests for DemucsService audio loading and separation plumbing"""
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("demucs")
+sf = pytest.importorskip("soundfile")
+
+from app.services.demucs_service import DemucsService
+
+SOURCES = ["drums", "bass", "other", "vocals"]
+
+
+def _make_service() -> DemucsService:
+    """A DemucsService wired to a stand-in separator (no model weights loaded)."""
+    service = DemucsService.__new__(DemucsService)
+    service.model_name = "htdemucs"
+    service.device = "cpu"
+    service.segment = None
+    service.overlap = 0.25
+    service.precision = "fp32"
+    service.batch_size = 1
+    service._lock = threading.Lock()
+    service._amp_dtype = None
+    service._cuda_graphs = False
+    service.separator = SimpleNamespace(
+        samplerate=44100,
+        audio_channels=2,
+        model=SimpleNamespace(sources=SOURCES)
+    )
+    return service
+
+
+def test_separate_mono_input_at_model_rate(tmp_path, monkeypatch):
+    # Mono at the model's rate is upmixed by convert_audio with expand(); the
+    # in-place normalization used to fail on that view
+    samplerate = 44100
+    t = np.arange(samplerate, dtype=np.float32) / samplerate
+    input_path = tmp_path / "mono.wav"
+    sf.write(input_path, 0.5 * np.sin(2 * np.pi * 440 * t), samplerate)
+
+    service = _make_service()
+    # Echo the (normalized) mix as every stem instead of running a model
+    monkeypatch.setattr(
+        service,
+        "_apply",
+        lambda mixes, shifts: [mix.unsqueeze(0).repeat(len(SOURCES), 1, 1) for mix in mixes]
+    )
+
+    stems = service._separate_sync(str(input_path), str(tmp_path), "job", shifts=1)
+
+    assert stems["guitar"] is None and stems["piano"] is None
+    for name in SOURCES:
+        info = sf.info(stems[name])
+        assert info.channels == 2
+        assert info.samplerate == samplerate
+        assert info.frames == samplerate
@@ -0,0 +1,70 @@
+"""Tests for lyric parsing and annotation matching"""
+import pytest
+
+pytest.importorskip("ahocorasick")
+pytest.importorskip("lxml")
+
+from app.utils.lyrics import MATCH_THRESHOLD, build_timed_annotations, normalize, parse_lrc, similarity
+
+
+def test_parse_lrc_reads_timestamps_after_other_tags():
+    lrc = "\n".join([
+        "[ar:Someone]",
+        "[offset:+0][00:01.00]first",
+        "[ar:x][00:02.50][00:04]second",
+        "[00:05.00] third ",
+        "no timestamp",
+    ])
+    assert list(parse_lrc(lrc)) == [
+        (1.0, "first"),
+        (2.5, "second"),
+        (4.0, "second"),
+        (5.0, "third"),
+    ]
+
+
+def _brute_force_annotations(line: str, fragment_annotations):
+    """Reference matcher: score every fragment against the line, as the original scan did."""
+    norm_line = normalize(line)
+    matched = []
+    for item in fragment_annotations:
+        fragment = normalize(item["fragment"])
+        if not fragment:
+            continue
+        if fragment in norm_line or similarity(fragment, norm_line) >= MATCH_THRESHOLD:
+            if item["annotation"] not in matched:
+                matched.append(item["annotation"])
+    return matched
+
+
+def test_matches_agree_with_brute_force_scan():
+    lines = [
+        "abzcdwef",
+        "Hello darkness my old friend",
+        "I've come to talk with you again",
+        "hello darkness, my old friend",
+        "xy",
+        "Something completely different",
+    ]
+    fragment_annotations = [
+        # Similar (0.75) to the first line without sharing a single trigram
+        {"fragment": "abxcdyef", "annotation": "no shared trigram"},
+        {"fragment": "hello darkness my old friend", "annotation": "verbatim"},
+        {"fragment": "come to talk with you", "annotation": "substring"},
+        {"fragment": "ive come to talk with you again", "annotation": "fuzzy"},
+        {"fragment": "xz", "annotation": "short"},
+        {"fragment": "unrelated words entirely", "annotation": "none"},
+        {"fragment": "", "annotation": "empty"},
+    ]
+    lrc = "\n".join(f"[00:{i:02d}.00]{line}" for i, line in enumerate(lines))
+
+    timed = build_timed_annotations(lrc, None, fragment_annotations)
+    assert [timed_line.annotations for timed_line in timed] == [
+        _brute_force_annotations(line, fragment_annotations) for line in lines
+    ]
+    assert timed[0].annotations == ["no shared trigram"]
+
+    untimed = build_timed_annotations(None, "\n".join(lines), fragment_annotations)
+    assert [timed_line.annotations for timed_line in untimed] == [
+        _brute_force_annotations(line, fragment_annotations) for line in lines
+    ]
@@ -97,14 +97,17 @@ export async function fetchCapabilities(signal?: AbortSignal): Promise<SystemCap
 }
 
 export async function uploadFile(file: File, quality: number, signal?: AbortSignal): Promise<JobResponse> {
-  const formData = new FormData();
   const normalizedFile = await normalizeAudioFile(file);
-  formData.append('file', normalizedFile);
-  formData.append('quality', quality.toString());
+  const params = new URLSearchParams({
+    filename: normalizedFile.name,
+    quality: quality.toString(),
+  });
 
-  const response = await fetch(getApiUrl('upload'), {
+  // Send the raw file bytes so the backend can stream them straight to disk
+  const response = await fetch(`${getApiUrl('upload')}?${params}`, {
     method: 'POST',
-    body: formData,
+    headers: { 'Content-Type': normalizedFile.type || 'application/octet-stream' },
+    body: normalizedFile,
     signal,
   });
 